@@ -2,10 +2,13 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 import os
 import json
+import threading
 from PIL import Image, ImageTk
 
 from app.paths import get_resource_path, get_data_path, is_valid_data_file_path
 from app.parse import scrapeTextFromUrl
+from app.embed import matchNewJob
+from app.job_search import JobSearch
 from app.Windows.custom_dropdown import CustomDropdown
 from app.Windows.add_job_dialog import AddJobDialog
 from app.Windows.update_job_statuses_window import UpdateJobStatusesWindow
@@ -25,6 +28,11 @@ class JobTrackerApp:
         self.filtered_jobs = []
         self.search_timer = None
         self.status_filter_var = tk.StringVar(value="All Statuses")
+        self.semantic_search_var = tk.BooleanVar(value=False)
+        self.job_search = None
+        # Quick successive searches mustn't each create their own JobSearch
+        self.job_search_lock = threading.Lock()
+        self.search_generation = 0
         
         # Status colors
         self.status_colors = {
@@ -83,6 +91,12 @@ class JobTrackerApp:
                                relief=tk.FLAT, borderwidth=2)
         search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
 
+        # Rank jobs by meaning (title and pulled description) instead of substring
+        tk.Checkbutton(search_frame, text="Semantic", variable=self.semantic_search_var,
+                      command=self.filter_jobs, bg="#242424", fg="#e0e0e0",
+                      selectcolor="#3d3d3d", activebackground="#242424",
+                      activeforeground="#e0e0e0", font=("Arial", 10)).pack(side=tk.LEFT, padx=(10, 0))
+
         # Status Filter Dropdown
         tk.Label(search_frame, text="Status:", bg="#242424", fg="#e0e0e0", 
                 font=("Arial", 10)).pack(side=tk.LEFT, padx=(15, 10))
@@ -244,6 +258,20 @@ class JobTrackerApp:
         self.save_jobs()
         self.update_job_display()
 
+        # Check emails that arrived before this job was added
+        jobIndex = len(self.jobs) - 1
+        threading.Thread(target=self._match_new_job_thread, args=(jobIndex,), daemon=True).start()
+
+    def _match_new_job_thread(self, jobIndex):
+        try:
+            matched = matchNewJob(jobIndex)
+        except Exception as e:
+            print(f"Error matching new job against unmatched emails: {e}")
+            return
+
+        if matched:
+            self.root.after(0, self.reload_jobs_from_disk)
+
     def open_add_dialog(self):
         
         AddJobDialog(
@@ -527,11 +555,12 @@ class JobTrackerApp:
         delete_btn.pack(side=tk.LEFT, padx=5)
         
     def filter_jobs(self):
-        """Wait for 100ms after the last keypress before filtering"""
+        """Wait for 100ms (300ms for semantic search) after the last keypress before filtering"""
         if self.search_timer:
             self.root.after_cancel(self.search_timer)
         
-        self.search_timer = self.root.after(100, self._perform_filter)
+        delay = 300 if self.semantic_search_var.get() else 100
+        self.search_timer = self.root.after(delay, self._perform_filter)
 
     def _on_status_filter_change(self, new_status):
         self.status_filter_var.set(new_status)
@@ -542,6 +571,9 @@ class JobTrackerApp:
         search_term = self.search_var.get().lower()
         selected_status = self.status_filter_var.get()
         
+        # Results of an older semantic search still running are dropped
+        self.search_generation += 1
+
         # Start with all jobs
         filtered = self.jobs.copy()
         
@@ -549,6 +581,17 @@ class JobTrackerApp:
         if selected_status != "All Statuses":
             filtered = [job for job in filtered if job['status'] == selected_status]
             
+        # Semantic search may need to load the model or embed new
+        # descriptions, so it runs off the UI thread. It searches every job
+        # (its caches cover all of them) and the status filter is applied
+        # to the results.
+        if search_term and self.semantic_search_var.get():
+            self.job_count_label.config(text="Searching...")
+            threading.Thread(target=self._semantic_search_thread,
+                             args=(search_term, self.jobs.copy(), selected_status, self.search_generation),
+                             daemon=True).start()
+            return
+
         # Apply Search filter
         if search_term:
             filtered = [
@@ -560,6 +603,26 @@ class JobTrackerApp:
         
         self.filtered_jobs = filtered
         self.update_job_display()
+
+    def _semantic_search_thread(self, search_term, jobs, selected_status, generation):
+        try:
+            with self.job_search_lock:
+                if self.job_search is None:
+                    self.job_search = JobSearch()
+            ranked = [jobs[j] for j, _ in self.job_search.search(search_term, jobs)]
+            if selected_status != "All Statuses":
+                ranked = [job for job in ranked if job['status'] == selected_status]
+        except Exception as e:
+            print(f"Semantic search failed: {e}")
+            ranked = []
+
+        def show_results():
+            if generation != self.search_generation:
+                return
+            self.filtered_jobs = ranked
+            self.update_job_display()
+
+        self.root.after(0, show_results)
         
     def update_job_display(self, reset_scroll=True):
         # Reset scroll position to top
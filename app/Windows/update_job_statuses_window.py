@@ -1,11 +1,14 @@
 import tkinter as tk
+from tkinter import ttk
 import json
 import os
 import threading
 from PIL import Image, ImageTk
 
-from app.emails.gmail import checkGmailConnection, setupGmailConnection, getGmailEmails
+from app.emails.gmail import checkGmailConnection, setupGmailConnection, GmailSync
+from app.email_pipeline import EmailStream
 from app.embed import runEmbeddings
+from app.embedding_model import warmModel, getModelState
 from app.paths import get_resource_path, get_data_path
 from app.Windows.custom_message_box import CustomMessageBox
 
@@ -22,6 +25,7 @@ class UpdateJobStatusesWindow:
         self.reloadFunc = reloadFunc
 
         self.selected_provider = tk.StringVar(value="Gmail")
+        self.recheckProcessed = tk.BooleanVar(value=False)
 
         self.connectedStatus = False
 
@@ -38,17 +42,23 @@ class UpdateJobStatusesWindow:
         }
 
         self.provider_buttons = {}
+        self.emailStream = None
+        self.emailSync = None
+        self.cancelEvent = None
 
         self._create_window()
         self._build_ui()
 
+        # Start loading the embedding model now so "Run Embedding" doesn't wait on it
+        warmModel(onDone=lambda state: self.win.after(0, self._update_model_status))
+
     # -------------------------
     # Window setup
     # -------------------------
     def _create_window(self):
         self.win = tk.Toplevel(self.root)
         self.win.title("Update Job Statuses")
-        self.win.geometry("600x480")
+        self.win.geometry("600x560")
         self.win.configure(bg=self.card_bg)
 
         self.win.transient(self.root)
@@ -274,9 +284,55 @@ class UpdateJobStatusesWindow:
             pady=16,
             activebackground="#2980b9"
         )
-        self.embedBtn.pack(pady=(0, 12))
+        self.embedBtn.pack(pady=(0, 4))
         self.disable_embed_button()
 
+        tk.Checkbutton(
+            self.win,
+            text="Re-check already processed emails",
+            variable=self.recheckProcessed,
+            bg=self.card_bg,
+            fg=self.text_secondary,
+            selectcolor=self.card_bg,
+            activebackground=self.card_bg,
+            font=("Arial", 9)
+        ).pack(pady=(0, 4))
+
+        self.modelStatusLabel = tk.Label(
+            self.win,
+            text="",
+            bg=self.card_bg,
+            fg=self.text_secondary,
+            font=("Arial", 9)
+        )
+        self.modelStatusLabel.pack(pady=(0, 12))
+        self._update_model_status()
+
+        # Shown only while an embedding run is in progress
+        self.progressFrame = tk.Frame(self.win, bg=self.card_bg)
+        self.progressBar = ttk.Progressbar(self.progressFrame, orient=tk.HORIZONTAL, length=360, mode="determinate")
+        self.progressBar.pack(side=tk.LEFT, padx=(0, 8))
+        self.cancelBtn = tk.Button(
+            self.progressFrame,
+            text="Cancel",
+            command=self.cancel_embeddings,
+            bg="#e74c3c",
+            fg="white",
+            font=("Arial", 9, "bold"),
+            relief=tk.FLAT,
+            cursor="hand2",
+            padx=8,
+            activebackground="#c0392b"
+        )
+        self.cancelBtn.pack(side=tk.LEFT)
+        self.progressLabel = tk.Label(
+            self.win,
+            text="",
+            bg=self.card_bg,
+            fg=self.text_secondary,
+            font=("Arial", 9)
+        )
+
         self.logsBtn = tk.Button(
             self.win,
             text="View Logs",
@@ -382,6 +438,19 @@ class UpdateJobStatusesWindow:
     def enable_embed_button(self):
         self.embedBtnEnabled = True
 
+    def _update_model_status(self):
+        if not self.win.winfo_exists():
+            return
+
+        state = getModelState()
+        if state == "ready":
+            text = "Embedding model ready"
+        elif state == "failed":
+            text = "Embedding model failed to load"
+        else:
+            text = "Loading embedding model..."
+        self.modelStatusLabel.config(text=text)
+
     # -------------------------
     # Logic
     # -------------------------
@@ -414,9 +483,12 @@ class UpdateJobStatusesWindow:
                 self.pullBtn.config(text="Setup Email Connection", bg="green", fg="white")
         elif self.connected:
             if provider == "Gmail":
-                self.emails = getGmailEmails() 
-                print("Emails: ")
-                print(self.emails)
+                # Emails are fetched in the background and matched as they arrive
+                if self.emailStream is not None:
+                    self.emailStream.close()
+                # Re-checking needs the old emails downloaded again
+                self.emailSync = GmailSync(skipProcessed=not self.recheckProcessed.get())
+                self.emailStream = EmailStream(self.emailSync.iterEmails).start()
                 self.enable_embed_button()
                 self.embedBtn.config(bg="#3498db", fg="white")
             elif provider == "iCloud":
@@ -438,18 +510,85 @@ class UpdateJobStatusesWindow:
         self.disable_embed_button()
 
         self.embedBtn.config(text="Running...", bg="#3498db", fg="white")
+        self._show_progress()
 
         self.win.update_idletasks()
 
+        self.cancelEvent = threading.Event()
         threading.Thread(target=self.runEmbedThread, daemon=True).start()
 
+    def cancel_embeddings(self):
+        if self.cancelEvent is None or self.cancelEvent.is_set():
+            return
+        self.cancelEvent.set()
+        # Stop fetching too; the run ends at its next batch or encoder step
+        if self.emailStream is not None:
+            self.emailStream.close()
+        self.cancelBtn.config(text="Cancelling...")
+
+    def _show_progress(self):
+        self.progressBar.config(value=0, maximum=1)
+        self.progressLabel.config(text="Starting...")
+        self.cancelBtn.config(text="Cancel")
+        self.progressFrame.pack(before=self.logsBtn, pady=(0, 4))
+        self.progressLabel.pack(before=self.logsBtn, pady=(0, 12))
+
+    def _hide_progress(self):
+        self.progressFrame.pack_forget()
+        self.progressLabel.pack_forget()
+
+    def _update_progress(self, progress):
+        if not self.win.winfo_exists():
+            return
+
+        done = progress["done"]
+        total = progress["total"]
+        self.progressBar.config(maximum=max(total if total is not None else progress["received"], 1), value=done)
+
+        text = f"{done}/{total}" if total is not None else f"{done}/{progress['received']} (still fetching)"
+        text += f" · {progress['emailsPerSecond']:.1f} emails/s"
+        if progress["etaSeconds"] is not None:
+            minutes, seconds = divmod(int(progress["etaSeconds"]), 60)
+            text += f" · about {minutes}m {seconds:02d}s left"
+        self.progressLabel.config(text=text)
+
     def runEmbedThread(self):
-        invalidEmails, emailsUpdated = runEmbeddings(self.emails)
+        def onProgress(progress):
+            self.win.after(0, lambda: self._update_progress(progress))
+
+        try:
+            invalidEmails, emailsUpdated, stageCounts, cancelled = runEmbeddings(
+                self.emailStream,
+                onProgress=onProgress,
+                recheckProcessed=self.recheckProcessed.get(),
+                cancelEvent=self.cancelEvent
+            )
+            # Only a complete run moves the provider's sync checkpoint on
+            if not cancelled and not stageCounts["unhandled"] and self.emailSync is not None:
+                self.emailSync.commit()
+            message = (
+                ("Cancelled. Results so far were saved.\n" if cancelled else "") +
+                f"{emailsUpdated} job postings changed\n"
+                f"({stageCounts['lexical']} matched by company name, "
+                f"{stageCounts['semantic']} by embedding, "
+                f"{stageCounts['unmatched']} unmatched)"
+            )
+        except Exception as e:
+            # Batches matched before the failure are already committed
+            print(f"Embedding run failed: {e}")
+            message = f"Embedding run failed: {e}"
+        finally:
+            self.emailStream = None
+            self.emailSync = None
+            self.cancelEvent = None
+
+        self.win.after(0, self._hide_progress)
+
         # TODO: make logs viewable
         box = CustomMessageBox(
             self.win,
             title="Embedding Results",
-            message=f"{emailsUpdated} job postings changed"
+            message=message
         )
         self.enable_pull_button()
         self.enable_provider_buttons()
@@ -0,0 +1,101 @@
+import numpy as np
+
+from app.scoring import l2Normalize
+
+
+class IvfIndex:
+    """
+    Inverted-file (IVF) approximate nearest-neighbour index in plain NumPy.
+
+    Vectors are clustered around nlist centroids with spherical k-means. A
+    query only scores the vectors in its nprobe closest clusters, so search
+    cost grows with roughly sqrt(n) instead of n. The index stores centroid
+    assignments only; vectors are passed in at search time so it can sit on
+    top of the job embedding cache without copying it.
+    """
+
+    def __init__(self, centroids, assignments, trainedSize):
+        self.centroids = centroids.astype(np.float32)
+        self.assignments = assignments.astype(np.int32)
+        self.trainedSize = trainedSize
+        self._buildLists()
+
+    @classmethod
+    def train(cls, vectors, nlist=None, iterations=10, maxTrainingVectors=20000, seed=0):
+        vectors = l2Normalize(vectors)
+        rng = np.random.default_rng(seed)
+
+        n = len(vectors)
+        nlist = nlist or int(np.clip(np.sqrt(n), 1, 1024))
+        nlist = min(nlist, n)
+
+        sample = vectors
+        if n > maxTrainingVectors:
+            sample = vectors[rng.choice(n, maxTrainingVectors, replace=False)]
+
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)]
+        for _ in range(iterations):
+            labels = (sample @ centroids.T).argmax(axis=1)
+            for c in range(nlist):
+                members = sample[labels == c]
+                # Empty clusters keep their old centroid
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = l2Normalize(centroids)
+
+        assignments = (vectors @ centroids.T).argmax(axis=1)
+        return cls(centroids, assignments, n)
+
+    def _buildLists(self):
+        order = np.argsort(self.assignments, kind="stable")
+        bounds = np.searchsorted(self.assignments[order], np.arange(len(self.centroids) + 1))
+        self.lists = [order[bounds[c]:bounds[c + 1]] for c in range(len(self.centroids))]
+
+    def __len__(self):
+        return len(self.assignments)
+
+    def needsRetraining(self):
+        # Centroids trained on a much smaller set give lopsided clusters
+        return len(self) > 4 * self.trainedSize
+
+    def add(self, vectors):
+        """Assign vectors appended to the underlying matrix to their nearest cluster."""
+        if len(vectors) == 0:
+            return
+        vectors = l2Normalize(vectors)
+        newAssignments = (vectors @ self.centroids.T).argmax(axis=1)
+        self.assignments = np.concatenate([self.assignments, newAssignments.astype(np.int32)])
+        self._buildLists()
+
+    def search(self, queries, vectors, k, nprobe):
+        """
+        Return, for each query, the rows of vectors among its top-k within
+        the nprobe closest clusters. vectors must be unit length.
+        """
+        queries = l2Normalize(queries)
+        nprobe = min(nprobe, len(self.centroids))
+
+        centroidScores = queries @ self.centroids.T
+        if nprobe < len(self.centroids):
+            probes = np.argpartition(-centroidScores, nprobe - 1, axis=1)[:, :nprobe]
+        else:
+            probes = np.tile(np.arange(len(self.centroids)), (len(queries), 1))
+
+        results = []
+        for q in range(len(queries)):
+            candidates = np.concatenate([self.lists[c] for c in probes[q]])
+            if len(candidates) > k:
+                scores = vectors[candidates] @ queries[q]
+                candidates = candidates[np.argpartition(-scores, k - 1)[:k]]
+            results.append(candidates)
+
+        return results
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            np.savez(f, centroids=self.centroids, assignments=self.assignments, trainedSize=self.trainedSize)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(data["centroids"], data["assignments"], int(data["trainedSize"]))
@@ -0,0 +1,135 @@
+import queue
+import threading
+import time
+
+
+class EmailStream:
+    """
+    Runs an email generator on a background thread and hands emails to the
+    matcher through a bounded queue.
+
+    The fetcher blocks once maxBuffered emails are waiting, so memory stays
+    bounded however large the mailbox is, and matching can start as soon as
+    the first emails arrive. Errors raised by the generator are re-raised in
+    the consuming thread.
+    """
+
+    _DONE = object()
+
+    def __init__(self, emailSource, maxBuffered=2048):
+        self.emailSource = emailSource
+        self.queue = queue.Queue(maxsize=maxBuffered)
+        self.received = 0
+        self.produced = 0
+        self.fetching = True
+        self._closed = threading.Event()
+        self._finished = False
+        self._thread = threading.Thread(target=self._produce, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    @property
+    def total(self):
+        """Number of emails fetched in all, or None while still fetching."""
+        return None if self.fetching else self.produced
+
+    def close(self):
+        """
+        Stop fetching; the producer thread exits at its next put and a
+        consumer waiting for emails stops once the queue is drained.
+        """
+        self._closed.set()
+
+    def _put(self, item):
+        while not self._closed.is_set():
+            try:
+                self.queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self):
+        try:
+            for email in self.emailSource():
+                if not self._put(email):
+                    return
+                self.produced += 1
+        except Exception as e:
+            self._put(e)
+        self.fetching = False
+        self._put(self._DONE)
+
+    def _take(self, timeout=None):
+        """
+        Next email, or None once the stream is finished or closed. Waits up
+        to timeout seconds (forever if None) and raises queue.Empty after.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = 0.5 if deadline is None else min(0.5, max(deadline - time.monotonic(), 0))
+            try:
+                item = self.queue.get(block=wait > 0, timeout=wait if wait > 0 else None)
+                break
+            except queue.Empty:
+                if self._closed.is_set():
+                    self._finished = True
+                    return None
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise
+        if item is self._DONE:
+            self._finished = True
+            return None
+        if isinstance(item, Exception):
+            self._finished = True
+            raise item
+        self.received += 1
+        return item
+
+    def batches(self, maxSize, minSize=1, linger=0.0):
+        """
+        Yield lists of up to maxSize emails. Waits for at least one email,
+        then up to linger seconds for the batch to reach minSize, and takes
+        whatever else has already arrived without waiting. The last batch
+        may be smaller.
+        """
+        while not self._finished:
+            email = self._take()
+            if email is None:
+                return
+
+            batch = [email]
+            deadline = time.monotonic() + linger
+            while len(batch) < maxSize and not self._finished:
+                wait = deadline - time.monotonic() if len(batch) < minSize else 0
+                try:
+                    email = self._take(timeout=max(wait, 0))
+                except queue.Empty:
+                    break
+                if email is not None:
+                    batch.append(email)
+
+            yield batch
+
+
+def knownTotal(emails):
+    """Total emails to match, or None while a stream is still fetching."""
+    if isinstance(emails, EmailStream):
+        return emails.total
+    return len(emails)
+
+
+def iterBatches(emails, maxSize, minSize=1, linger=0.0):
+    """
+    Split a list or an EmailStream into batches for the matcher. A stream
+    that is slower than the matcher waits (see EmailStream.batches) rather
+    than yielding a batch for every email or two.
+    """
+    if isinstance(emails, EmailStream):
+        yield from emails.batches(maxSize, minSize, linger)
+        return
+
+    for start in range(0, len(emails), maxSize):
+        yield emails[start:start + maxSize]
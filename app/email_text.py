@@ -0,0 +1,159 @@
+import re
+
+from bs4 import BeautifulSoup
+
+from app.settings import getSetting, getSettings
+
+
+# Rough stand-in for the model's WordPiece tokens: words and single
+# punctuation marks. WordPiece splits rare words further, so budgets here
+# are kept a little under the model's 256 token limit.
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+MAX_CHARS_PER_TOKEN = 16
+
+# Everything after one of these lines is an older message being quoted
+QUOTED_REPLY_PATTERNS = [
+    re.compile(r"^on .+ wrote:$"),
+    re.compile(r"^-+ ?original message ?-+$"),
+    re.compile(r"^-+ ?forwarded message ?-+$"),
+    re.compile(r"^from: .+"),
+]
+
+# Everything after one of these lines is the sender's signature
+SIGNATURE_PATTERNS = [
+    re.compile(r"^-- ?$"),
+    re.compile(r"^(best|kind|warm|warmest)? ?regards[,.!]?$"),
+    re.compile(r"^(best|all the best|cheers|sincerely|respectfully)[,.!]?$"),
+    re.compile(r"^(thanks|thank you|many thanks)[,.!]?$"),
+    re.compile(r"^sent from my .+"),
+]
+
+# Lines that are boilerplate rather than message content
+FOOTER_PATTERNS = [
+    re.compile(r"(this|the) (e-?mail|message|communication).*confidential"),
+    re.compile(r"intended (solely )?(only )?for the (use of the )?(individual|addressee|recipient)"),
+    re.compile(r"unsubscribe"),
+    re.compile(r"privacy (policy|notice)"),
+    re.compile(r"all rights reserved"),
+    re.compile(r"^©|\(c\) \d{4}"),
+    re.compile(r"equal (employment )?opportunity employer"),
+    re.compile(r"do not reply to this (e-?mail|message)"),
+]
+
+
+def htmlToText(body):
+    # Only pay for an HTML parse when the body actually looks like HTML
+    if "<" not in body or ">" not in body:
+        return body
+
+    soup = BeautifulSoup(body, "lxml")
+    return soup.get_text(separator="\n", strip=True)
+
+
+def _matchesAny(patterns, line):
+    return any(p.search(line) for p in patterns)
+
+
+def stripBoilerplate(text):
+    """
+    Remove quoted replies, signatures and legal footers from an email body.
+    Works line by line on lowercased text.
+    """
+    lines = []
+
+    for line in text.lower().splitlines():
+        line = line.strip()
+
+        if line.startswith(">"):
+            continue
+
+        # Nothing after a quoted reply or a signature is the sender's message,
+        # but only treat it as such once some real content has been seen
+        if lines and (_matchesAny(QUOTED_REPLY_PATTERNS, line) or _matchesAny(SIGNATURE_PATTERNS, line)):
+            break
+
+        if _matchesAny(FOOTER_PATTERNS, line):
+            continue
+
+        if line:
+            lines.append(line)
+
+    return "\n".join(lines)
+
+
+def _tokenSpans(text):
+    return [m.span() for m in TOKEN_PATTERN.finditer(text)]
+
+
+def capTokens(text, budget):
+    """Cut text after its first `budget` tokens."""
+    spans = _tokenSpans(text)
+    if len(spans) <= budget:
+        return text
+    return text[:spans[budget - 1][1]]
+
+
+def chunkTokens(text, budget, maxChunks):
+    """Split text into at most maxChunks pieces of at most `budget` tokens."""
+    spans = _tokenSpans(text)
+    chunks = []
+
+    for start in range(0, len(spans), budget):
+        if len(chunks) == maxChunks:
+            break
+        end = min(start + budget, len(spans))
+        chunks.append(text[spans[start][0]:spans[end - 1][1]])
+
+    return chunks or [""]
+
+
+def normalize(text: str) -> str:
+    """
+    Basic text normalization to reduce noise before embedding.
+    """
+    return " ".join(text.lower().split())
+
+
+def emailTextSettings():
+    """
+    prepareEmailText's arguments from the settings, read in one go so a run
+    can pass them to every email instead of re-reading settings.json.
+    """
+    settings = getSettings()
+    return {
+        "tokenBudget": settings["emailTokenBudget"],
+        "chunk": settings["chunkLongEmails"],
+        "maxChunks": settings["maxEmailChunks"],
+    }
+
+
+def prepareEmailText(email, tokenBudget=None, chunk=None, maxChunks=None):
+    """
+    Turn an email into the text(s) fed to the encoder.
+
+    The body is stripped of quoted replies, signatures and footers and then
+    capped at tokenBudget tokens (subject included). With chunking enabled a
+    long body is instead split into up to maxChunks pieces, each prefixed
+    with the subject, so the caller can max-pool scores over them.
+    Returns a list of normalized texts; it has one entry unless chunking.
+    """
+    tokenBudget = tokenBudget or getSetting("emailTokenBudget")
+    chunk = getSetting("chunkLongEmails") if chunk is None else chunk
+    maxChunks = maxChunks or getSetting("maxEmailChunks")
+
+    subject = normalize(email.get("subject") or "")
+    body = normalize(stripBoilerplate(htmlToText(email.get("body") or "")))
+
+    subjectTokens = len(_tokenSpans(subject))
+    bodyBudget = max(tokenBudget - subjectTokens, 1)
+
+    # Tokens are rarely longer than this, so there's no need to scan the
+    # rest of a very long body
+    body = body[:MAX_CHARS_PER_TOKEN * bodyBudget * (maxChunks if chunk else 1)]
+
+    if chunk:
+        bodies = chunkTokens(body, bodyBudget, maxChunks)
+    else:
+        bodies = [capTokens(body, bodyBudget)]
+
+    return [(subject + " " + b).strip() for b in bodies]
@@ -1,196 +1,382 @@
-from googleapiclient.discovery import build
-from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request
-from google_auth_oauthlib.flow import InstalledAppFlow
+from googleapiclient.errors import HttpError
 import base64
+import json
 import os
+import time
 
 
-from app.paths import get_data_path, get_copied_data_file_path
+from app.emails.gmail_client import getGmailClient
+from app.emails.gmail_fetch import ConcurrentMessageFetcher, MAX_FETCH_ATTEMPTS, backoffDelay, isRetryableStatus
+from app.paths import get_data_path
+from app.processed_emails import ProcessedEmailIndex
+from app.settings import getSetting
+from app.storage import writeJsonAtomic
 
 
-def checkGmailConnection():
-    SCOPES = ["https://www.googleapis.com/auth/gmail.readonly"]
-    TOKEN_FILE =  get_data_path("data/gmail/token.json")
-
-    creds = None
+syncStateFilePath = get_data_path("data/gmail/sync_state.json")
 
-    # Load existing token if it exists
-    if os.path.exists(TOKEN_FILE):
-        creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
+# Response masks: only the parts of a message the matcher reads
+METADATA_FIELDS = "id,threadId,labelIds,payload/headers"
+FULL_FIELDS = "id,threadId,labelIds,payload(headers,body/data,parts(mimeType,body/data))"
 
-    # If no credentials or invalid and cannot refresh, return False
-    if not creds:
-        return False
-
-    if creds.expired and creds.refresh_token:
-        try:
-            creds.refresh(Request())
-        except Exception as e:
-            print(f"Failed to refresh token: {e}")
-            return False
-    elif creds.expired:
-        # Token expired and no refresh token
-        return False
 
-    try:
-        # Build the Gmail service
-        service = build("gmail", "v1", credentials=creds)
-        # Test connection by listing labels
-        labels = service.users().labels().list(userId="me").execute()
-        return "labels" in labels
-    except Exception as e:
-        print(f"Error connecting to Gmail: {e}")
-        return False
+def checkGmailConnection():
+    return getGmailClient().isConnected()
 
 
 def setupGmailConnection():
     """
     Ensures Gmail OAuth connection exists and is valid.
-    Creates/refreshes token.json if needed.
+    Runs the OAuth flow and creates token.json if needed.
     Returns True if connection is successful, False otherwise.
     """
-
-    SCOPES = ["https://www.googleapis.com/auth/gmail.readonly"]
-    TOKEN_FILE =  get_data_path("data/gmail/token.json")
-    CRED_FILE = get_copied_data_file_path("data/gmail/credentials.json")
-
-    creds = None
+    client = getGmailClient()
+    if client.isConnected():
+        return True
 
     try:
-        # Load existing token if present
-        if os.path.exists(TOKEN_FILE):
-            creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
-
-        # Refresh or create credentials if needed
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-            else:
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    CRED_FILE,
-                    SCOPES
-                )
-                creds = flow.run_local_server(port=0)
-
-            # Save updated token
-            with open(TOKEN_FILE, "w") as token:
-                token.write(creds.to_json())
-
-        # Build service and make a lightweight test call
-        service = build("gmail", "v1", credentials=creds)
-        service.users().labels().list(userId="me").execute()
-
+        client.authorize()
+        client.labels(refresh=True)
         return True
 
     except Exception as e:
         print(f"Gmail connection failed: {e}")
+        client.reset()
         return False
 
 def getGmailService():
-    SCOPES = ["https://www.googleapis.com/auth/gmail.readonly"]
-    TOKEN_FILE =  get_data_path("data/gmail/token.json")
-
-    if not os.path.exists(TOKEN_FILE):
-        raise Exception("Gmail not connected. Run setupGmailConnection first.")
-
-    creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
-    return build("gmail", "v1", credentials=creds)
+    return getGmailClient().service()
 
 def getGmailEmails():
-    emails = []
-
-    LABEL_NAMES = ["Internship-Rejected", "Internship-Interview"]
+    return list(iterGmailEmails())
+
+# Most requests the Gmail API accepts in one batch; the batch size used is
+# the "gmailBatchSize" setting, capped at this
+GMAIL_BATCH_LIMIT = 100
+
+
+def _decode(data):
+    return base64.urlsafe_b64decode(data).decode("utf-8", errors="ignore")
+
+def _getHeader(headers, name):
+    for h in headers:
+        if h["name"].lower() == name.lower():
+            return h["value"]
+    return None
+
+def _getBody(payload):
+    if "parts" in payload:
+        for part in payload["parts"]:
+            # The fields mask leaves out an empty body (e.g. an attachment's)
+            if part.get("mimeType") == "text/plain" and "data" in part.get("body", {}):
+                return _decode(part["body"]["data"])
+    if "data" in payload.get("body", {}):
+        return _decode(payload["body"]["data"])
+    return ""
+
+def _status(error):
+    status = getattr(getattr(error, "resp", None), "status", None)
+    return None if status is None else int(status)
+
+def _isRetryable(error):
+    status = _status(error)
+    if status is None:
+        # No HTTP status: the connection itself failed
+        return isinstance(error, OSError)
+    return isRetryableStatus(status, str(error))
+
+def batchGetMessages(service, messageIds, failed=None, **getArgs):
+    """
+    Yield (messageId, message) for each id, fetched with Gmail batch
+    requests instead of one round-trip per message.
+
+    Each item of a batch succeeds or fails on its own: rate-limited and
+    server errors are retried in a later batch with exponential backoff,
+    other errors are reported and skipped. Ids that were skipped or given
+    up on are appended to failed, except messages deleted since they were
+    listed (404).
+    """
+    batchSize = max(1, min(int(getSetting("gmailBatchSize")), GMAIL_BATCH_LIMIT))
+    pending = list(messageIds)
+    attempt = 0
+
+    while pending:
+        retry = []
+
+        for start in range(0, len(pending), batchSize):
+            chunk = pending[start:start + batchSize]
+            fetched = {}
+
+            def onResponse(requestId, response, exception):
+                if exception is None:
+                    fetched[requestId] = response
+                elif _isRetryable(exception):
+                    retry.append(requestId)
+                else:
+                    print(f"Skipping Gmail message {requestId}: {exception}")
+                    if failed is not None and _status(exception) != 404:
+                        failed.append(requestId)
+
+            batch = service.new_batch_http_request(callback=onResponse)
+            for messageId in chunk:
+                batch.add(service.users().messages().get(userId="me", id=messageId, **getArgs), request_id=messageId)
+
+            try:
+                batch.execute()
+            except Exception as e:
+                # The whole batch failed before any item was answered
+                if not _isRetryable(e):
+                    raise
+                retry.extend(m for m in chunk if m not in fetched and m not in retry)
+
+            for messageId in chunk:
+                if messageId in fetched:
+                    yield messageId, fetched[messageId]
+
+        attempt += 1
+        if retry and attempt >= MAX_FETCH_ATTEMPTS:
+            print(f"Giving up on {len(retry)} Gmail messages after {attempt} attempts")
+            if failed is not None:
+                failed.extend(retry)
+            return
+
+        if retry:
+            time.sleep(backoffDelay(attempt))
+        pending = retry
+
+class GmailSync:
+    """
+    One pull of the labelled emails.
+
+    The first pull lists every labelled message. It records the mailbox
+    historyId from the start of the pull in data/gmail/sync_state.json, and
+    later pulls ask users.history.list only for messages that gained one of
+    the labels since then. A full pull happens again only when Gmail no
+    longer has history that far back (404) or the labels changed.
+
+    The checkpoint only moves once commit() is called, after the fetched
+    emails have been matched and saved, so a pull that is cancelled or
+    crashes is simply fetched again next time. It doesn't move at all if
+    some messages couldn't be fetched (see failed), since history.list
+    wouldn't name them again.
+
+    Messages already in the processed-email index are dropped by id straight
+    after listing, before anything is downloaded. With skipProcessed=False
+    (re-checking old emails) the checkpoint is ignored and every labelled
+    message is listed and downloaded.
+    """
 
-    # Ensure Gmail is connected
-    if not setupGmailConnection():
-        raise Exception("Gmail connection failed")
+    def __init__(self, skipProcessed=True):
+        self.newState = None
+        self.checkpointExpired = False
+        self.processed = ProcessedEmailIndex() if skipProcessed else None
+        self.skipped = 0
+        # Ids of messages that couldn't be fetched this pull
+        self.failed = []
+        self.concurrentFetcher = None
+
+    def _getMessages(self, service, messageIds, **getArgs):
+        """Fetch messages with batch requests or, in "concurrent" mode, parallel gets."""
+        if getSetting("gmailFetchMode") != "concurrent":
+            return batchGetMessages(service, messageIds, failed=self.failed, **getArgs)
+
+        if self.concurrentFetcher is None:
+            self.concurrentFetcher = ConcurrentMessageFetcher(getGmailClient().session())
+        return self.concurrentFetcher.fetch(messageIds, failed=self.failed, **getArgs)
+
+    def _incrementalIds(self, service, labelId, startHistoryId):
+        messageIds = []
+        page_token = None
 
-    service = getGmailService()
+        while True:
+            response = service.users().history().list(
+                userId="me",
+                startHistoryId=startHistoryId,
+                labelId=labelId,
+                historyTypes=["labelAdded", "messageAdded"],
+                maxResults=500,
+                pageToken=page_token
+            ).execute()
 
-    # ---------------------
-    # Helpers
-    # ---------------------
-    def decode(data):
-        return base64.urlsafe_b64decode(data).decode("utf-8", errors="ignore")
+            for record in response.get("history", []):
+                for added in record.get("labelsAdded", []):
+                    if labelId in added.get("labelIds", []):
+                        messageIds.append(added["message"]["id"])
+                for added in record.get("messagesAdded", []):
+                    if labelId in added["message"].get("labelIds", []):
+                        messageIds.append(added["message"]["id"])
 
-    def get_header(headers, name):
-        for h in headers:
-            if h["name"].lower() == name.lower():
-                return h["value"]
-        return None
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                return messageIds
 
-    def get_body(payload):
-        if "parts" in payload:
-            for part in payload["parts"]:
-                if part["mimeType"] == "text/plain" and "data" in part["body"]:
-                    return decode(part["body"]["data"])
-        if "data" in payload.get("body", {}):
-            return decode(payload["body"]["data"])
-        return ""
-
-    # ---------------------
-    # Find label IDs
-    # ---------------------
-    all_labels = service.users().labels().list(userId="me").execute()["labels"]
-
-    label_id_map = {}
-    for name in LABEL_NAMES:
-        lid = next((l["id"] for l in all_labels if l["name"] == name), None)
-        if lid:
-            label_id_map[name] = lid
-        else:
-            print(f"Warning: Label '{name}' not found")
-
-    if not label_id_map:
-        raise Exception("No valid labels found")
-
-    # ---------------------
-    # Fetch messages
-    # ---------------------
-    seen_ids = set()
-
-    for label_name, label_id in label_id_map.items():
+    def _fullSyncPages(self, service, labelId):
         page_token = None
 
         while True:
             response = service.users().messages().list(
                 userId="me",
-                labelIds=[label_id],
+                labelIds=[labelId],
                 maxResults=500,
                 pageToken=page_token
             ).execute()
 
-            for msg in response.get("messages", []):
-                if msg["id"] in seen_ids:
-                    continue
-                seen_ids.add(msg["id"])
-
-                message = service.users().messages().get(
-                    userId="me",
-                    id=msg["id"],
-                    format="full"
-                ).execute()
-
-                headers = message["payload"]["headers"]
-
-                email_type = (
-                    "Rejected" if label_name == "Internship-Rejected"
-                    else "Interview"
-                )
-
-                emails.append({
-                    "id": msg["id"],
-                    "from": get_header(headers, "From"),
-                    "to": get_header(headers, "To"),
-                    "subject": get_header(headers, "Subject"),
-                    "date": get_header(headers, "Date"),
-                    "body": get_body(message["payload"]),
-                    "type": email_type
-                })
+            yield [msg["id"] for msg in response.get("messages", [])]
 
             page_token = response.get("nextPageToken")
             if not page_token:
-                break
+                return
+
+    def _messageIdPages(self, service, labelId, state):
+        """Yield lists of candidate message ids for one label."""
+        if state is not None and not self.checkpointExpired:
+            try:
+                yield self._incrementalIds(service, labelId, state["historyId"])
+                return
+            except HttpError as e:
+                if getattr(e.resp, "status", None) != 404:
+                    raise
+                print("Gmail history checkpoint expired, doing a full sync")
+                self.checkpointExpired = True
+
+        yield from self._fullSyncPages(service, labelId)
+
+    def _dropKnownByHeaders(self, service, messageIds):
+        """
+        Emails logged before message ids were recorded are only known by
+        subject + date. While such entries exist, fetch just those headers
+        first and skip the full download for emails already handled; their
+        id is recorded so later pulls skip them straight after listing.
+        """
+        if self.processed is None or not messageIds or not self.processed.hasFallbackKeys():
+            return messageIds
+
+        remaining = []
+        for message_id, message in self._getMessages(
+            service, messageIds, format="metadata", metadataHeaders=["Subject", "Date"], fields=METADATA_FIELDS
+        ):
+            headers = message.get("payload", {}).get("headers", [])
+            email = {"id": message_id, "subject": _getHeader(headers, "Subject"), "date": _getHeader(headers, "Date")}
+            if self.processed.contains(email):
+                self.processed.add(email)
+                self.skipped += 1
+            else:
+                remaining.append(message_id)
+
+        self.processed.save()
+        return remaining
+
+    def iterEmails(self):
+        """
+        Yield labelled emails one at a time as they are fetched, so matching can
+        start while later pages are still being downloaded.
+        """
+        LABEL_NAMES = ["Internship-Rejected", "Internship-Interview"]
+
+        # Ensure Gmail is connected; the client is shared with the connection
+        # check, so this normally costs no extra round-trip
+        if not setupGmailConnection():
+            raise Exception("Gmail connection failed")
+
+        client = getGmailClient()
+        service = client.service()
+
+        # ---------------------
+        # Find label IDs
+        # ---------------------
+        all_labels = client.labels()
+        if not set(LABEL_NAMES) <= {l["name"] for l in all_labels}:
+            # The labels may have been created since they were last listed
+            all_labels = client.labels(refresh=True)
+
+        label_id_map = {}
+        for name in LABEL_NAMES:
+            lid = next((l["id"] for l in all_labels if l["name"] == name), None)
+            if lid:
+                label_id_map[name] = lid
+            else:
+                print(f"Warning: Label '{name}' not found")
+
+        if not label_id_map:
+            raise Exception("No valid labels found")
+
+        # Taken before listing, so changes made during this pull are picked
+        # up by the next one
+        historyId = service.users().getProfile(userId="me").execute()["historyId"]
+
+        # Re-checking needs the old emails too, not just those added since
+        state = loadSyncState() if self.processed is not None else None
+        if state is not None and state.get("labels") != label_id_map:
+            state = None
+
+        # ---------------------
+        # Fetch messages
+        # ---------------------
+        seen_ids = set()
+
+        for label_name, label_id in label_id_map.items():
+            email_type = (
+                "Rejected" if label_name == "Internship-Rejected"
+                else "Interview"
+            )
+
+            for page_ids in self._messageIdPages(service, label_id, state):
+                message_ids = []
+                for message_id in page_ids:
+                    if message_id in seen_ids:
+                        continue
+                    seen_ids.add(message_id)
+                    if self.processed is not None and self.processed.containsId(message_id):
+                        self.skipped += 1
+                        continue
+                    message_ids.append(message_id)
+
+                message_ids = self._dropKnownByHeaders(service, message_ids)
+
+                for message_id, message in self._getMessages(service, message_ids, format="full", fields=FULL_FIELDS):
+                    # History can name messages that lost the label again since
+                    if label_id not in message.get("labelIds", [label_id]):
+                        continue
+
+                    headers = message["payload"].get("headers", [])
+
+                    yield {
+                        "id": message_id,
+                        "threadId": message.get("threadId"),
+                        "from": _getHeader(headers, "From"),
+                        "to": _getHeader(headers, "To"),
+                        "subject": _getHeader(headers, "Subject"),
+                        "date": _getHeader(headers, "Date"),
+                        "body": _getBody(message["payload"]),
+                        "type": email_type
+                    }
+
+        self.newState = {"historyId": historyId, "labels": label_id_map}
+
+    def commit(self):
+        """Move the checkpoint forward once every fetched email has been handled."""
+        if self.failed:
+            print(f"{len(self.failed)} Gmail messages couldn't be fetched; "
+                  "keeping the sync checkpoint so the next pull retries them")
+            return
+        if self.newState is not None:
+            writeJsonAtomic(syncStateFilePath, self.newState)
+
+
+def loadSyncState():
+    if not os.path.exists(syncStateFilePath):
+        return None
+    try:
+        with open(syncStateFilePath, "r") as f:
+            state = json.load(f)
+    except Exception as e:
+        print(f"Ignoring unreadable Gmail sync state: {e}")
+        return None
+    return state if state.get("historyId") else None
+
 
-    return emails
+def iterGmailEmails():
+    """Yield every new labelled email and move the sync checkpoint afterwards."""
+    sync = GmailSync()
+    yield from sync.iterEmails()
+    sync.commit()
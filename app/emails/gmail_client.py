@@ -0,0 +1,183 @@
+from googleapiclient.discovery import build_from_document
+from googleapiclient.http import build_http
+from google.oauth2.credentials import Credentials
+from google.auth.transport.requests import AuthorizedSession, Request
+from google_auth_httplib2 import AuthorizedHttp
+from google_auth_oauthlib.flow import InstalledAppFlow
+import json
+import os
+import threading
+import time
+
+
+from app.paths import get_data_path, get_copied_data_file_path
+from app.storage import writeJsonAtomic
+
+
+SCOPES = ["https://www.googleapis.com/auth/gmail.readonly"]
+tokenFilePath = get_data_path("data/gmail/token.json")
+discoveryFilePath = get_data_path("data/gmail/gmail_v1_discovery.json")
+
+DISCOVERY_URL = "https://gmail.googleapis.com/$discovery/rest?version=v1"
+# The discovery document rarely changes; fetch a fresh copy after this long
+DISCOVERY_MAX_AGE = 30 * 24 * 3600
+
+
+def _loadDiscoveryDocument(session):
+    """
+    Return the Gmail v1 discovery document, from the copy on disk when it
+    is recent enough, else from the client library or the discovery URL.
+    """
+    if os.path.exists(discoveryFilePath) and time.time() - os.path.getmtime(discoveryFilePath) < DISCOVERY_MAX_AGE:
+        try:
+            with open(discoveryFilePath, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Ignoring unreadable Gmail discovery document: {e}")
+
+    document = None
+    try:
+        # google-api-python-client 2.x ships the documents with the library
+        from googleapiclient.discovery_cache import get_static_doc
+        document = get_static_doc("gmail", "v1")
+    except ImportError:
+        pass
+
+    if document is None:
+        response = session.get(DISCOVERY_URL, timeout=30)
+        response.raise_for_status()
+        document = response.text
+
+    document = json.loads(document)
+    writeJsonAtomic(discoveryFilePath, document)
+    return document
+
+
+class GmailClient:
+    """
+    The authenticated Gmail connection shared by connection checks and pulls.
+
+    Credentials are loaded from data/gmail/token.json once and only refreshed
+    when they have expired. The discovery document is read once (from its
+    copy on disk) and the API service built from it over an httplib2
+    transport that keeps its connection open between calls. httplib2 isn't
+    thread-safe, and a new pull can start while the previous one's fetch
+    thread is still finishing a request, so every thread gets a service and
+    transport of its own. The concurrent fetcher shares one pooled
+    AuthorizedSession. Once labels.list has succeeded the connection counts
+    as verified, so checking it again costs no round-trip.
+    """
+
+    def __init__(self):
+        self.creds = None
+        self._session = None
+        self._discovery = None
+        # Per-thread services; stamped with _generation so reset() drops them
+        self._local = threading.local()
+        self._generation = 0
+        self._labels = None
+        # Token refreshes go through one plain (unauthorized) pooled session
+        self._tokenRequest = Request()
+        self._lock = threading.RLock()
+
+    def reset(self):
+        """Forget everything, e.g. after the token was revoked."""
+        with self._lock:
+            self.creds = None
+            self._session = None
+            self._generation += 1
+            self._labels = None
+
+    def _saveToken(self):
+        os.makedirs(os.path.dirname(tokenFilePath), exist_ok=True)
+        with open(tokenFilePath, "w") as token:
+            token.write(self.creds.to_json())
+
+    def session(self):
+        """A connection-pooled requests session that signs its requests."""
+        with self._lock:
+            if self._session is None:
+                self._session = AuthorizedSession(self.credentials())
+            return self._session
+
+    def credentials(self):
+        """
+        Return valid credentials, refreshing them only if they have expired.
+        Raises if Gmail was never connected or the token can't be refreshed.
+        """
+        with self._lock:
+            if self.creds is None:
+                if not os.path.exists(tokenFilePath):
+                    raise Exception("Gmail not connected. Run setupGmailConnection first.")
+                self.creds = Credentials.from_authorized_user_file(tokenFilePath, SCOPES)
+
+            if not self.creds.valid:
+                if not (self.creds.expired and self.creds.refresh_token):
+                    raise Exception("Gmail token expired and can't be refreshed")
+                self.creds.refresh(self._tokenRequest)
+                self._saveToken()
+
+            return self.creds
+
+    def authorize(self):
+        """Run the browser OAuth flow and store the new token."""
+        with self._lock:
+            flow = InstalledAppFlow.from_client_secrets_file(
+                get_copied_data_file_path("data/gmail/credentials.json"),
+                SCOPES
+            )
+            self.reset()
+            self.creds = flow.run_local_server(port=0)
+            self._saveToken()
+
+    def service(self):
+        """The calling thread's API service, built on its first call."""
+        with self._lock:
+            # Also refreshes (and saves) the token if it has expired since
+            creds = self.credentials()
+            if self._discovery is None:
+                self._discovery = _loadDiscoveryDocument(self.session())
+            generation = self._generation
+
+        local = self._local
+        if getattr(local, "generation", None) != generation:
+            local.service = build_from_document(self._discovery, http=AuthorizedHttp(creds, http=build_http()))
+            local.generation = generation
+        return local.service
+
+    def labels(self, refresh=False):
+        """The mailbox's labels, listed once and reused unless refresh is set."""
+        with self._lock:
+            service = self.service()
+            if self._labels is None or refresh:
+                self._labels = service.users().labels().list(userId="me").execute()["labels"]
+            return self._labels
+
+    def isConnected(self):
+        """True if the stored token works; only calls Gmail the first time."""
+        with self._lock:
+            if self.creds is None and not os.path.exists(tokenFilePath):
+                return False
+            try:
+                if self._labels is not None:
+                    self.credentials()
+                    return True
+                self.labels()
+                return True
+            except Exception as e:
+                print(f"Error connecting to Gmail: {e}")
+                self.reset()
+                return False
+
+
+_client = None
+_clientLock = threading.Lock()
+
+
+def getGmailClient():
+    """The process-wide GmailClient."""
+    global _client
+    with _clientLock:
+        if _client is None:
+            _client = GmailClient()
+        return _client
@@ -0,0 +1,149 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from app.settings import getSetting
+
+
+# Quota units Gmail charges for one messages.get call
+MESSAGES_GET_UNITS = 5
+# Attempts per message before a rate-limited or failing fetch is given up
+MAX_FETCH_ATTEMPTS = 5
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+# First backoff delay in seconds; doubles per attempt up to MAX_BACKOFF
+BASE_BACKOFF = 1.0
+MAX_BACKOFF = 32.0
+
+
+def isRetryableStatus(status, body=""):
+    # Per-user rate limits can also come back as 403 rateLimitExceeded
+    return status in RETRYABLE_STATUSES or (status == 403 and "ratelimitexceeded" in body.lower())
+
+
+def backoffDelay(attempt):
+    """Exponential backoff with jitter for the given (0-based) retry."""
+    delay = min(BASE_BACKOFF * 2 ** attempt, MAX_BACKOFF)
+    return delay + random.random() * BASE_BACKOFF
+
+
+class TokenBucket:
+    """
+    Thread-safe limiter handing out quota units at `rate` per second, with
+    bursts of up to `capacity` units.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, units=1):
+        """Block until `units` are available, then take them."""
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= units:
+                    self.tokens -= units
+                    return
+                wait = (units - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Hold every caller back for about `seconds`, e.g. after a 429."""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+
+class FetchError(Exception):
+    def __init__(self, messageId, status, detail):
+        super().__init__(f"{status}: {detail}")
+        self.messageId = messageId
+        self.status = status
+
+
+class ConcurrentMessageFetcher:
+    """
+    Fetches Gmail messages with several messages.get requests in flight at
+    once, as an alternative to batch requests.
+
+    session is anything with a requests-style get(url, params, timeout):
+    an AuthorizedSession for the real API, or a plain requests.Session for
+    a local fake server (see benchmarks/fake_gmail_server.py). A shared
+    token bucket keeps all workers under the per-user quota, and failed
+    requests back off exponentially, honouring Retry-After when given.
+    """
+
+    def __init__(self, session, baseUrl=None, workers=None, unitsPerSecond=None):
+        self.session = session
+        self.baseUrl = (baseUrl or getSetting("gmailApiBaseUrl")).rstrip("/")
+        self.workers = max(1, int(workers or getSetting("gmailFetchWorkers")))
+        # No bursts: Gmail measures quota over a moving window, so requests
+        # are paced evenly instead of spending a second's quota at once
+        self.bucket = TokenBucket(unitsPerSecond or getSetting("gmailQuotaUnitsPerSecond"), capacity=MESSAGES_GET_UNITS)
+        self.retries = 0
+
+    def _get(self, messageId, params):
+        url = f"{self.baseUrl}/gmail/v1/users/me/messages/{messageId}"
+
+        for attempt in range(MAX_FETCH_ATTEMPTS):
+            self.bucket.acquire(MESSAGES_GET_UNITS)
+
+            retryAfter = None
+            try:
+                response = self.session.get(url, params=params, timeout=30)
+            except OSError as e:
+                # Connection failures (requests' errors are OSErrors too)
+                status, detail = None, str(e)
+            else:
+                if response.status_code == 200:
+                    return response.json()
+                status, detail = response.status_code, response.text
+                if not isRetryableStatus(status, detail):
+                    raise FetchError(messageId, status, detail[:200])
+                retryAfter = response.headers.get("Retry-After")
+
+            if attempt + 1 == MAX_FETCH_ATTEMPTS:
+                break
+
+            try:
+                delay = float(retryAfter)
+            except (TypeError, ValueError):
+                delay = backoffDelay(attempt)
+
+            # Being throttled means every worker is going too fast
+            if status in (403, 429):
+                self.bucket.pause(delay)
+
+            self.retries += 1
+            time.sleep(delay)
+
+        raise FetchError(messageId, status, f"gave up after {MAX_FETCH_ATTEMPTS} attempts: {detail[:200]}")
+
+    def fetch(self, messageIds, failed=None, **params):
+        """
+        Yield (messageId, message) in completion order. Messages that can't
+        be fetched are reported, skipped and appended to failed, except
+        messages deleted since they were listed (404).
+        """
+        pool = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            futures = {pool.submit(self._get, messageId, params): messageId for messageId in messageIds}
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result()
+                except FetchError as e:
+                    print(f"Skipping Gmail message {e.messageId}: {e}")
+                    if failed is not None and e.status != 404:
+                        failed.append(e.messageId)
+        finally:
+            # A consumer that stops early shouldn't wait for the rest
+            pool.shutdown(wait=False, cancel_futures=True)
@@ -1,36 +1,27 @@
 import json
-from bs4 import BeautifulSoup
+import numpy as np
 import os
+import time
 
 from app.paths import get_data_path
+from app.embedding_model import getModel
+from app.embedding_pool import EncoderPool
+from app.email_pipeline import iterBatches, knownTotal
+from app.email_text import emailTextSettings, normalize, prepareEmailText
+from app.job_embedding_cache import JobEmbeddingCache, hashText
+from app.lexical_matcher import JobLexicalIndex, emailEvidence
+from app.match_cache import MatchCache, emailTextKey, jobSetVersion
+from app.processed_emails import MatchDecisions, ProcessedEmailIndex, emailKeys
+from app.scoring import cosineScores, maxPoolChunks, topK
+from app.settings import getSetting
+from app.storage import writeJsonAtomic
+from app.tracing import startTrace
+from app.unmatched_queue import UnmatchedEmailQueue, emailTimestamp
 
 
 jobsDataJsonFilePath = get_data_path("data/jobs_data.json")
 logsJsonFilePath = get_data_path("data/logs.json")
 
-def normalize(text: str) -> str:
-    """
-    Basic text normalization to reduce noise before embedding.
-    """
-    return " ".join(text.lower().split())
-
-
-def getEmailInput(emailList, emailID):
-    
-
-    html = emailList[emailID]["body"]
-
-    soup = BeautifulSoup(html, "lxml")
-
-    text = soup.get_text(separator="\n", strip=True)
-
-    emailInput = emailList[emailID]["subject"] + "\n" + text
-
-    emailInput = emailInput.lower()
-
-    return emailInput
-
-
 def getJobFileContent():
     if not os.path.exists(jobsDataJsonFilePath):
         raise ValueError("jobs data json missing")
@@ -39,13 +30,16 @@ def getJobFileContent():
     with open(jobsDataJsonFilePath, "r") as f:
         return json.load(f)
 
+def formatJobText(job):
+    return "Company: " + job["company"] + " | Role: " + job["title"]
+
 def getJobText():
     data = getJobFileContent()
 
     job_texts = []
 
     for j in range(len(data)):
-        job_texts.append("Company: " + data[j]["company"] + " | Role: " + data[j]["title"])
+        job_texts.append(formatJobText(data[j]))
 
     return job_texts
 
@@ -60,93 +54,633 @@ def getLogFileContent():
     with open(logsJsonFilePath, "r") as f:
         return json.load(f)
 
-def updateJobStatus(index, updatedStatus):
-    data = getJobFileContent()
+class EmbeddingRunTransaction:
+    """
+    Unit of work for one embedding run.
 
-    data[index]["status"] = updatedStatus
+    Status changes and log entries are buffered in memory and written by
+    commit() in a single pass: jobs_data.json and logs.json are each
+    rewritten once via temp file + rename, then the unmatched-email queue and
+    the processed-email index are saved. Nothing touches disk if the run dies
+    before commit().
+    """
 
-    with open(jobsDataJsonFilePath, "w") as f:
-        json.dump(data, f, indent=2)
+    def __init__(self, processedIndex=None, unmatchedQueue=None, decisions=None):
+        self.processedIndex = processedIndex
+        self.unmatchedQueue = unmatchedQueue
+        self.decisions = decisions
+        self.statusChanges = {}
+        self.jobsUpdated = []
+        self.emailsViewed = []
+        self.unmatched = []
 
-def updateEmailLog(inputEmail):
-    # update emailsViewed list in logs
-    data = getLogFileContent()
+    def updateJobStatus(self, index, updatedStatus):
+        self.statusChanges[index] = updatedStatus
 
-    data["emailsViewed"].append(inputEmail)
+    def logJobUpdated(self, jobInput):
+        self.jobsUpdated.append(jobInput)
 
-    with open(logsJsonFilePath, "w") as f:
-        json.dump(data, f, indent=2)
+    def logEmailViewed(self, email):
+        self.emailsViewed.append({"id": email.get("id"), "subject": email["subject"], "date": email["date"]})
+        self.processedIndex.add(email)
 
-def updateJobsUpdatedLog(jobInput):
-    # update updated list in logs
-    data = getLogFileContent()
+    def queueUnmatched(self, email, texts, embeddings):
+        self.unmatched.append((email, texts, embeddings))
 
-    data["JobsUpdated"].append(jobInput)
+    def commit(self):
+        if self.statusChanges:
+            jobs = getJobFileContent()
+            for index, updatedStatus in self.statusChanges.items():
+                jobs[index]["status"] = updatedStatus
+            writeJsonAtomic(jobsDataJsonFilePath, jobs, indent=2, ensure_ascii=False)
 
-    with open(logsJsonFilePath, "w") as f:
-        json.dump(data, f, indent=2)
+        if self.jobsUpdated or self.emailsViewed:
+            logs = getLogFileContent()
+            logs["JobsUpdated"].extend(self.jobsUpdated)
+            logs["emailsViewed"].extend(self.emailsViewed)
+            writeJsonAtomic(logsJsonFilePath, logs, indent=2)
+
+        if self.unmatchedQueue is not None:
+            for email, texts, embeddings in self.unmatched:
+                self.unmatchedQueue.add(email, texts, embeddings)
+            self.unmatchedQueue.save()
+
+        if self.decisions is not None:
+            self.decisions.save()
+
+        # Saved last: if anything above fails the emails are simply retried
+        if self.processedIndex is not None:
+            self.processedIndex.save()
+
+        self.statusChanges = {}
+        self.jobsUpdated = []
+        self.emailsViewed = []
+        self.unmatched = []
 
-def emailContainedInLog(emailSubject, emailDate):
-    data = getLogFileContent()
-    
-    for i in range(len(data["emailsViewed"])):
-        if (data["emailsViewed"][i]["subject"] == emailSubject and data["emailsViewed"][i]["date"] == emailDate):
-            return True
-    return False
 
 # ---- Embedding ----
 
-def runEmbeddings(emailList):
-    from sentence_transformers import SentenceTransformer
-    from sklearn.metrics.pairwise import cosine_similarity
-    # Load embedding model
-    model = SentenceTransformer("all-MiniLM-L6-v2")
+ENCODE_BATCH_SIZE = 32
+# Emails matched and committed together; about one encoder progress step
+# (PROGRESS_BATCH_SIZE), so a cancelled run loses little finished work
+MATCH_BATCH_SIZE = 256
+# A slow fetch is waited on for up to STREAM_LINGER_SECONDS to fill a batch
+# of at least this many, so each email doesn't get its own encode and commit
+MIN_STREAM_BATCH_SIZE = 64
+STREAM_LINGER_SECONDS = 2.0
+# Best jobs remembered per email in the match cache
+MATCH_CACHE_TOP_K = 5
+
+def matchEmbeddings(emailEmbeddings, jobEmbeddings, chunkStarts=None):
+    """
+    Score every email against every job with a single matrix multiply.
+    jobEmbeddings must be unit length, as JobEmbeddingCache returns them.
+    Returns (bestIndices, bestScores, scores) where scores is the full
+    emails x jobs cosine similarity matrix.
 
-    invalidEmails = []
-    emailsUpdated = 0
-    job_info = getJobFileContent()
-    job_texts = getJobText()
-    for i in range(len(emailList)):
-        emailInput = getEmailInput(emailList, i)
+    If emails were split into chunks, chunkStarts gives the row of each
+    email's first chunk and an email scores the max over its chunks.
+    """
+    scores = maxPoolChunks(cosineScores(emailEmbeddings, jobEmbeddings), chunkStarts)
+
+    bestIndices = scores.argmax(axis=1)
+    bestScores = scores[np.arange(len(scores)), bestIndices]
+
+    return bestIndices, bestScores, scores
 
-        # skip if email is already checked
-        if (emailContainedInLog(emailList[i]["subject"], emailList[i]["date"])):
+def annMatchEmbeddings(emailEmbeddings, cache, jobRows, chunkStarts):
+    """
+    Like matchEmbeddings, but only scores a shortlist of jobs per email taken
+    from the cache's ANN index. The shortlist is re-ranked exactly.
+    Returns (bestIndices, bestScores, shortlists) where each shortlist is a
+    (jobIndices, scores) pair.
+    """
+    rowToJobs = {}
+    for j, row in enumerate(jobRows):
+        rowToJobs.setdefault(int(row), []).append(j)
+
+    candidates = cache.getAnnIndex().search(
+        emailEmbeddings,
+        cache.embeddings,
+        k=getSetting("annCandidates"),
+        nprobe=getSetting("annProbes")
+    )
+
+    bounds = list(chunkStarts) + [len(emailEmbeddings)]
+    bestIndices = []
+    bestScores = []
+    shortlists = []
+
+    for e in range(len(chunkStarts)):
+        rows = np.unique(np.concatenate(candidates[bounds[e]:bounds[e + 1]]))
+        jobs = [j for row in rows for j in rowToJobs.get(int(row), [])]
+
+        if not jobs:
+            bestIndices.append(-1)
+            bestScores.append(-1.0)
+            shortlists.append(([], np.zeros(0, dtype=np.float32)))
             continue
 
-        texts = [normalize(emailInput)] + [normalize(t) for t in job_texts]
-        embeddings = model.encode(texts)
+        scores = cosineScores(emailEmbeddings[bounds[e]:bounds[e + 1]], cache.embeddings[jobRows[jobs]]).max(axis=0)
 
-        email_embedding = embeddings[0]
-        job_embeddings = embeddings[1:]
+        best = int(scores.argmax())
+        bestIndices.append(jobs[best])
+        bestScores.append(float(scores[best]))
+        shortlists.append((jobs, scores))
 
-        # ---- Similarity ----
-        scores = cosine_similarity([email_embedding], job_embeddings)[0]
+    return np.array(bestIndices), np.array(bestScores), shortlists
 
-        best_index = scores.argmax()
-        best_score = scores[best_index]
+class EmbeddingRunCancelled(Exception):
+    """Raised inside a run once its cancel event is set."""
 
-        # ---- Decision ----
-        THRESHOLD = 0.5
 
-        if best_score < THRESHOLD:
-            result = -1
-        else:
-            result = best_index
-
-        # ---- Debug output (optional, but recommended while tuning) ----
-        print("Similarity scores:")
-        for k, score in enumerate(scores):
-            print(f"{k}: {job_texts[k]} -> {score:.3f}")
-
-        print("\nFinal result:", result)
-        print("\n\n")
-        
-        if (result == -1):
-            invalidEmails.append(emailList[i])
+def threadKey(email):
+    """Thread and label an email belongs to, or None if the fetcher gave no thread."""
+    if not email.get("threadId"):
+        return None
+    return (email["threadId"], email["type"])
+
+class EmailMatcher:
+    """
+    Matches emails to saved jobs batch by batch and commits each batch.
+
+    Job data, the lexical index and job embeddings are loaded once per run,
+    so batches can keep arriving from a live fetch without redoing setup.
+    Emails that name a saved company outright are resolved by the lexical
+    index; only the rest go through the embedding model.
+    """
+
+    def __init__(self, recheckProcessed=False, tracer=None, cancelEvent=None):
+        self.recheckProcessed = recheckProcessed
+        self.cancelEvent = cancelEvent
+        self.tracer = tracer or startTrace()
+
+        with self.tracer.span("load", stage="jobs") as span:
+            self.job_info = getJobFileContent()
+            self.job_texts = getJobText()
+            self.processed = ProcessedEmailIndex()
+            self.decisions = MatchDecisions()
+            self.lexical = JobLexicalIndex(self.job_info)
+            self.unmatchedQueue = UnmatchedEmailQueue()
+            span["jobs"] = len(self.job_info)
+
+        # Cached match results and decisions refer to jobs by text hash, so
+        # they survive reordering and tell which jobs were added or removed
+        self.normalized_job_texts = [normalize(t) for t in self.job_texts]
+        self.job_keys = [hashText(t) for t in self.normalized_job_texts]
+        self.key_to_job = {}
+        for j, key in enumerate(self.job_keys):
+            self.key_to_job.setdefault(key, j)
+        # Emails left unmatched earlier; the fallback when a re-checked
+        # email's decision predates MatchDecisions
+        self.unmatchedKeys = {emailKeys(entry)[0] for entry in self.unmatchedQueue.entries} if recheckProcessed else set()
+        # Read once, not for every email
+        self.textSettings = emailTextSettings()
+        self.seen = set()
+        # (timestamp, result) of the newest message matched so far per thread
+        self.threadResults = {}
+
+        self.invalidEmails = []
+        self.emailsUpdated = 0
+        self.emailsDone = 0
+        # "unhandled": received but left unprocessed because no jobs are saved
+        self.stageCounts = {"lexical": 0, "semantic": 0, "unmatched": 0, "thread": 0, "unhandled": 0}
+
+        # Loaded the first time an email needs the model
+        self.model = None
+        self.encoder = None
+        self.cache = None
+        self.job_embeddings = None
+        self.job_rows = None
+        self.matchCache = None
+
+    def checkCancelled(self):
+        if self.cancelEvent is not None and self.cancelEvent.is_set():
+            raise EmbeddingRunCancelled()
+
+    def finish(self):
+        if self.encoder is not None:
+            self.encoder.close()
+        if self.matchCache is not None:
+            with self.tracer.span("commit", stage="matchCache"):
+                self.matchCache.save()
+        self.tracer.event("run", emailsDone=self.emailsDone, emailsUpdated=self.emailsUpdated, **self.stageCounts)
+        self.tracer.close()
+
+    def _loadEmbeddings(self):
+        with self.tracer.span("load", stage="embeddings") as span:
+            self._loadEmbeddingsUntraced()
+            span["ann"] = self.use_ann
+
+    def _loadEmbeddingsUntraced(self):
+        # Shared model, already warm if the update window has been open a while
+        self.model = getModel()
+        # Worker processes, if used, are started once and reused by every batch
+        self.encoder = EncoderPool(self.model)
+
+        # Each job text is encoded once and cached on disk across runs
+        self.cache = JobEmbeddingCache()
+        normalized_job_texts = self.normalized_job_texts
+        self.use_ann = len(self.job_texts) >= getSetting("annMinJobs")
+
+        # This is the full job list, so rows of deleted jobs can be dropped
+        if self.use_ann:
+            self.job_rows = self.cache.getRows(self.model, normalized_job_texts, compact=True)
         else:
-            emailsUpdated+=1
-            updateJobStatus(result, emailList[i]["type"])
-            updateJobsUpdatedLog({"company": job_info[result]["company"], "title": job_info[result]["title"], "type": emailList[i]["type"]})
-        updateEmailLog({"subject": emailList[i]["subject"], "date": emailList[i]["date"]})
+            self.job_embeddings = self.cache.getEmbeddings(self.model, normalized_job_texts, compact=True)
+
+        self.job_version = jobSetVersion(self.job_keys)
+        self.matchCache = MatchCache()
+        self.matchCache.registerVersion(self.job_version, self.job_keys)
+
+    def _jobEmbeddingsFor(self, keys):
+        return self.cache.embeddings[[self.cache.rows[k] for k in keys]]
+
+    def _updateStaleTopk(self, entry, embedding):
+        """
+        Bring a top-k scored against an older job set up to date by dropping
+        removed jobs and scoring only the jobs added since.
+        Returns None when that isn't possible and a full rescore is needed.
+        """
+        oldKeys = self.matchCache.jobKeysFor(entry["version"])
+        if oldKeys is None:
+            return None
+
+        topk = [(key, score) for key, score in entry["topk"] if key in self.key_to_job]
+
+        # Every job in the old top-k is gone; the best of the rest is unknown
+        if not topk and any(key in oldKeys for key in self.key_to_job):
+            return None
+
+        added = [key for key in self.key_to_job if key not in oldKeys]
+        if added:
+            scores = cosineScores(embedding, self._jobEmbeddingsFor(added)).max(axis=0)
+            topk += zip(added, scores.tolist())
+
+        return sorted(topk, key=lambda item: item[1], reverse=True)[:MATCH_CACHE_TOP_K]
+
+    def _semanticMatch(self, emails, email_chunks, onEncodeProgress):
+        """
+        Return the matched job index (or -1) for each email, along with the
+        embeddings of each email's chunks.
+
+        Emails seen before reuse their cached top-k when the job set hasn't
+        changed, or are rescored against added jobs only when it has.
+        """
+        if self.model is None:
+            self._loadEmbeddings()
+
+        email_keys = [emailTextKey(chunks) for chunks in email_chunks]
+        topks = [None] * len(emails)
+        per_email_embeddings = [None] * len(emails)
+        fresh = set()
+
+        for e, key in enumerate(email_keys):
+            entry = self.matchCache.get(key)
+            if entry is None:
+                continue
+            embedding = self.matchCache.embeddingFor(entry)
+            if entry["version"] == self.job_version:
+                topks[e] = [tuple(item) for item in entry["topk"]]
+                fresh.add(e)
+            else:
+                topks[e] = self._updateStaleTopk(entry, embedding)
+            if topks[e] is not None:
+                per_email_embeddings[e] = embedding
+
+        to_encode = [e for e in range(len(emails)) if topks[e] is None]
+        encoded = set(to_encode)
+
+        if to_encode:
+            # All remaining emails go through the model in one batched call.
+            # Long emails may be split into several chunks; chunk_starts marks
+            # each email's first one.
+            email_texts = []
+            chunk_starts = []
+            for e in to_encode:
+                chunk_starts.append(len(email_texts))
+                email_texts.extend(email_chunks[e])
+            with self.tracer.span("encode", emails=len(to_encode), texts=len(email_texts)):
+                email_embeddings = self.encoder.encode(email_texts, batchSize=ENCODE_BATCH_SIZE, onProgress=onEncodeProgress)
+
+            # ---- Similarity ----
+            with self.tracer.span("score", stage="semantic", emails=len(to_encode), ann=self.use_ann):
+                if self.use_ann:
+                    # Large job lists: only score each email's ANN shortlist
+                    _, _, shortlists = annMatchEmbeddings(email_embeddings, self.cache, self.job_rows, chunk_starts)
+                else:
+                    _, _, scores = matchEmbeddings(email_embeddings, self.job_embeddings, chunk_starts)
+                    shortlists = [(range(len(row)), row) for row in scores]
+
+            bounds = chunk_starts + [len(email_embeddings)]
+            for row, e in enumerate(to_encode):
+                jobs, job_scores = shortlists[row]
+                best, best_scores = topK(job_scores, MATCH_CACHE_TOP_K)
+                # Duplicate job texts share a key; keep its best score
+                topks[e] = []
+                for j, score in zip(np.asarray(jobs, dtype=np.int64)[best], best_scores):
+                    key = self.job_keys[j]
+                    if all(key != k for k, _ in topks[e]):
+                        topks[e].append((key, float(score)))
+                per_email_embeddings[e] = email_embeddings[bounds[row]:bounds[row + 1]]
+
+        # ---- Decision ----
+        threshold = getSetting("matchThreshold")
+        decisions = []
+        for e in range(len(emails)):
+            if e not in fresh:
+                self.matchCache.put(email_keys[e], self.job_version, topks[e], per_email_embeddings[e])
+
+            if topks[e] and topks[e][0][1] >= threshold:
+                decisions.append(self.key_to_job[topks[e][0][0]])
+            else:
+                decisions.append(-1)
+
+            if self.tracer.enabled("debug"):
+                self.tracer.event(
+                    "topk",
+                    level="debug",
+                    email=emails[e].get("id"),
+                    subject=emails[e].get("subject"),
+                    cached="fresh" if e in fresh else ("stale" if e not in encoded else None),
+                    topk=[[self.key_to_job[key], self.job_texts[self.key_to_job[key]], round(score, 4)] for key, score in topks[e]],
+                    result=decisions[-1]
+                )
+
+        return decisions, per_email_embeddings
+
+    def _previousDecision(self, email, decision):
+        """
+        Job hash (or None) a re-checked email was matched to last time.
+        Without a record, an email still in the unmatched queue matched
+        nothing and any other is assumed unchanged, so it is left alone.
+        """
+        if self.decisions.isKnown(email):
+            return self.decisions.get(email)
+        if emailKeys(email)[0] in self.unmatchedKeys:
+            return None
+        return decision
+
+    def matchBatch(self, emails, onProgress=None):
+        """
+        Match one batch of emails and commit the results.
+        Raises EmbeddingRunCancelled if the run is cancelled meanwhile; when
+        that happens during encoding, the emails already resolved by the
+        lexical stage (and their thread followers) are committed first.
+        """
+        if not self.job_texts:
+            # Nothing to match against; the emails stay unprocessed
+            self.stageCounts["unhandled"] += len(emails)
+            return
+        self.checkCancelled()
+
+        # skip emails that are already checked (or repeated within this run),
+        # unless asked to check processed emails again
+        pending = []
+        rechecked = set()
+        for email in emails:
+            key = emailKeys(email)[0]
+            if key in self.seen:
+                continue
+            if self.processed.contains(email):
+                if not self.recheckProcessed:
+                    continue
+                rechecked.add(len(pending))
+            self.seen.add(key)
+            pending.append(email)
+
+        # Already-processed emails count as done straight away
+        self.emailsDone += len(emails) - len(pending)
+
+        if not pending:
+            if onProgress:
+                onProgress(self.emailsDone)
+            return
+
+        # Messages of one thread (under the same label) share a match: only
+        # the newest is scored and the rest take its result. Batches don't
+        # arrive in date order, so a message newer than the one a thread was
+        # matched on in an earlier batch is scored again.
+        representatives = {}
+        followers = {}
+        for p, email in enumerate(pending):
+            thread = threadKey(email)
+            if thread is None:
+                continue
+            matched = self.threadResults.get(thread)
+            if matched is not None and emailTimestamp(email) <= matched[0]:
+                followers[p] = thread
+                continue
+            rep = representatives.get(thread)
+            if rep is None or emailTimestamp(email) > emailTimestamp(pending[rep]):
+                if rep is not None:
+                    followers[rep] = thread
+                representatives[thread] = p
+            else:
+                followers[p] = thread
+
+        to_match = [p for p in range(len(pending)) if p not in followers]
+
+        with self.tracer.span("extract", emails=len(to_match)):
+            email_chunks = {p: prepareEmailText(pending[p], **self.textSettings) for p in to_match}
+
+        # ---- Stage 1: lexical company match ----
+        results = [None] * len(pending)
+        semantic = []
+        unmatched_embeddings = {}
+        with self.tracer.span("score", stage="lexical", emails=len(to_match)) as span:
+            for p in to_match:
+                results[p] = self.lexical.match(" ".join(email_chunks[p]), emailEvidence(pending[p]))
+                if results[p] is None:
+                    semantic.append(p)
+                else:
+                    self.stageCounts["lexical"] += 1
+            span["matched"] = len(to_match) - len(semantic)
+
+        # ---- Stage 2: embeddings for whatever is left ----
+        cancelled = False
+        if semantic:
+            def onEncodeProgress(done, total):
+                self.checkCancelled()
+                if onProgress:
+                    onProgress(self.emailsDone + (len(pending) * done) // total)
+
+            try:
+                decisions, embeddings = self._semanticMatch(
+                    [pending[p] for p in semantic],
+                    [email_chunks[p] for p in semantic],
+                    onEncodeProgress
+                )
+            except EmbeddingRunCancelled:
+                # Left unprocessed, so the next run picks them up again
+                cancelled = True
+                decisions, embeddings = [], []
+            for p, result, embedding in zip(semantic, decisions, embeddings):
+                results[p] = result
+                self.stageCounts["semantic" if result != -1 else "unmatched"] += 1
+                if result == -1:
+                    unmatched_embeddings[p] = embedding
+
+        for thread, p in representatives.items():
+            if results[p] is not None:
+                self.threadResults[thread] = (emailTimestamp(pending[p]), results[p])
+
+        transaction = EmbeddingRunTransaction(self.processed, self.unmatchedQueue, self.decisions)
+        committed = 0
+
+        for p, (email, result) in enumerate(zip(pending, results)):
+            if p in followers:
+                if followers[p] not in self.threadResults:
+                    continue
+                result = self.threadResults[followers[p]][1]
+            elif result is None:
+                continue
+            committed += 1
+            decision = self.job_keys[result] if result != -1 else None
+
+            # A re-checked email only touches its job if its match changed
+            changed = p not in rechecked or decision != self._previousDecision(email, decision)
+            self.decisions.set(email, decision)
+
+            if p in followers:
+                # The thread's status was already updated from its newest message
+                self.stageCounts["thread"] += 1
+            elif (result == -1):
+                self.invalidEmails.append(email)
+                # Kept so a job added later can still be matched to it
+                if p not in rechecked:
+                    transaction.queueUnmatched(email, email_chunks[p], unmatched_embeddings[p])
+            elif changed:
+                self.emailsUpdated+=1
+                transaction.updateJobStatus(result, email["type"])
+                transaction.logJobUpdated({"company": self.job_info[result]["company"], "title": self.job_info[result]["title"], "type": email["type"]})
+            if p not in rechecked:
+                transaction.logEmailViewed(email)
+
+        with self.tracer.span("commit", stage="batch", emails=committed):
+            transaction.commit()
+
+        self.emailsDone += committed
+        if cancelled:
+            raise EmbeddingRunCancelled()
+        if onProgress:
+            onProgress(self.emailsDone)
+
+def runEmbeddings(emails, onProgress=None, recheckProcessed=False, cancelEvent=None):
+    """
+    Match emails to saved jobs and update their statuses.
+
+    emails is either a list or an EmailStream that is still being fetched;
+    batches are matched and committed as they arrive. With recheckProcessed,
+    emails from earlier runs are matched again (cheaply, from the match
+    cache) instead of being skipped.
+
+    onProgress(progress) is called as emails finish matching, with a dict of
+    done, received, total (None while still fetching), emailsPerSecond and
+    etaSeconds (None until there is a rate to go on).
 
-    return invalidEmails, emailsUpdated
\ No newline at end of file
+    Setting cancelEvent (a threading.Event) stops the run at the next batch
+    or encoder step; batches finished before that stay committed.
+
+    Returns (invalidEmails, emailsUpdated, stageCounts, cancelled) where
+    stageCounts says how many emails each stage matched, and how many were
+    left unhandled because there were no jobs to match against.
+    """
+    matcher = EmailMatcher(recheckProcessed, cancelEvent=cancelEvent)
+    received = 0
+    started = time.perf_counter()
+    cancelled = False
+
+    def reportProgress(done):
+        elapsed = time.perf_counter() - started
+        rate = done / elapsed if elapsed > 0 else 0.0
+        total = knownTotal(emails)
+        remaining = (received if total is None else total) - done
+        onProgress({
+            "done": done,
+            "received": received,
+            "total": total,
+            "emailsPerSecond": rate,
+            "etaSeconds": remaining / rate if rate > 0 else None,
+        })
+
+    try:
+        for batch in iterBatches(emails, MATCH_BATCH_SIZE, MIN_STREAM_BATCH_SIZE, STREAM_LINGER_SECONDS):
+            received += len(batch)
+            matcher.matchBatch(batch, onProgress=reportProgress if onProgress else None)
+    except EmbeddingRunCancelled:
+        cancelled = True
+    finally:
+        matcher.finish()
+
+    # Cancelling also closes the stream, which can end the loop normally
+    if cancelEvent is not None and cancelEvent.is_set():
+        cancelled = True
+
+    stageCounts = matcher.stageCounts
+    print(f"Matched {stageCounts['lexical']} emails by company name, "
+          f"{stageCounts['semantic']} by embedding, {stageCounts['unmatched']} unmatched, "
+          f"{stageCounts['thread']} shared with a newer message in their thread"
+          + (" (cancelled)" if cancelled else ""))
+
+    return matcher.invalidEmails, matcher.emailsUpdated, stageCounts, cancelled
+
+def _findJob(jobs, job):
+    """Index of job in jobs, ignoring its status, or None if it's gone."""
+    identity = {k: v for k, v in job.items() if k != "status"}
+    for j, other in enumerate(jobs):
+        if {k: v for k, v in other.items() if k != "status"} == identity:
+            return j
+    return None
+
+def matchNewJob(jobIndex):
+    """
+    Score a newly added job against the queue of previously unmatched emails,
+    so a rejection that arrived before the application was logged still
+    updates it. Only the new job is encoded and scored.
+    Returns the number of queued emails that matched.
+    """
+    queue = UnmatchedEmailQueue()
+    if not len(queue):
+        return 0
+
+    job_info = getJobFileContent()
+    job = job_info[jobIndex]
+
+    # Emails naming the company outright don't need the model
+    lexical = JobLexicalIndex([job])
+    matched = [
+        q for q, entry in enumerate(queue.entries)
+        if lexical.match(" ".join(entry["texts"]), emailEvidence(entry)) == 0
+    ]
+
+    if len(matched) < len(queue):
+        model = getModel()
+        job_embedding = JobEmbeddingCache().getEmbeddings(model, [normalize(formatJobText(job))])[0]
+        scores = queue.scoreJob(model, job_embedding)
+        matched_set = set(matched)
+        matched += [q for q in np.flatnonzero(scores >= getSetting("matchThreshold")) if q not in matched_set]
+
+    if not matched:
+        return 0
+
+    # Jobs may have been added or deleted while the model loaded
+    jobIndex = _findJob(getJobFileContent(), job)
+    if jobIndex is None:
+        return 0
+
+    decisions = MatchDecisions()
+    transaction = EmbeddingRunTransaction(unmatchedQueue=queue, decisions=decisions)
+    jobKey = hashText(normalize(formatJobText(job)))
+
+    # Oldest first, so the newest email decides the final status
+    for q in sorted(matched, key=lambda q: emailTimestamp(queue.entries[q])):
+        entry = queue.entries[q]
+        decisions.set(entry, jobKey)
+        transaction.updateJobStatus(jobIndex, entry["type"])
+        transaction.logJobUpdated({"company": job["company"], "title": job["title"], "type": entry["type"]})
+
+    queue.remove(matched)
+    transaction.commit()
+
+    return len(matched)
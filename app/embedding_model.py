@@ -0,0 +1,270 @@
+import os
+import threading
+
+import numpy as np
+
+from app.paths import get_data_path
+from app.settings import getSetting
+
+
+MAX_SEQ_LENGTH = 256
+
+
+def getOnnxModelDir(modelName=None):
+    modelName = modelName or getSetting("embeddingModel")
+    return get_data_path("data/models/" + modelName + "-onnx-int8")
+
+
+# -------------------------
+# Backends
+# -------------------------
+class TorchBackend:
+    """MiniLM (or another sentence-transformers model) through torch."""
+
+    name = "torch"
+
+    def __init__(self, modelName=None):
+        # Heavy import, so only pay for it when the model is needed
+        from sentence_transformers import SentenceTransformer
+        self.modelName = modelName or getSetting("embeddingModel")
+        self.model = SentenceTransformer(self.modelName)
+
+    def encode(self, texts, batch_size=32):
+        embeddings = self.model.encode(list(texts), batch_size=batch_size, convert_to_numpy=True)
+        return np.asarray(embeddings, dtype=np.float32)
+
+
+class OnnxBackend:
+    """
+    MiniLM through an int8-quantized ONNX Runtime session on CPU.
+    Needs only onnxruntime + tokenizers at run time; the model files are
+    produced once with exportOnnxModel().
+    """
+
+    name = "onnx"
+
+    def __init__(self, modelName=None):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.modelName = modelName or getSetting("embeddingModel")
+        modelDir = getOnnxModelDir(self.modelName)
+        modelPath = os.path.join(modelDir, "model_int8.onnx")
+        tokenizerPath = os.path.join(modelDir, "tokenizer.json")
+        if not (os.path.exists(modelPath) and os.path.exists(tokenizerPath)):
+            raise FileNotFoundError(f"No exported ONNX model in {modelDir}")
+
+        self.tokenizer = Tokenizer.from_file(tokenizerPath)
+        self.tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(modelPath, options, providers=["CPUExecutionProvider"])
+        self.inputNames = {i.name for i in self.session.get_inputs()}
+
+    def encode(self, texts, batch_size=32):
+        texts = list(texts)
+        batches = []
+
+        for start in range(0, len(texts), batch_size):
+            encodings = self.tokenizer.encode_batch(texts[start:start + batch_size])
+            inputIds = np.array([e.ids for e in encodings], dtype=np.int64)
+            attentionMask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+
+            feeds = {"input_ids": inputIds, "attention_mask": attentionMask}
+            if "token_type_ids" in self.inputNames:
+                feeds["token_type_ids"] = np.zeros_like(inputIds)
+
+            tokenEmbeddings = self.session.run(None, feeds)[0]
+
+            # Same pooling as the sentence-transformers model: mean over real
+            # tokens followed by L2 normalization
+            mask = attentionMask[..., None].astype(np.float32)
+            pooled = (tokenEmbeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            batches.append(pooled.astype(np.float32))
+
+        if not batches:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack(batches)
+
+
+BACKENDS = {
+    TorchBackend.name: TorchBackend,
+    OnnxBackend.name: OnnxBackend,
+}
+
+
+def createBackend(name=None, modelName=None):
+    """
+    Build the embedding backend picked by the "embeddingBackend" and
+    "embeddingModel" settings. Falls back to torch if the ONNX backend
+    isn't installed or exported.
+    """
+    name = name or getSetting("embeddingBackend")
+
+    if name not in BACKENDS:
+        print(f"Unknown embedding backend '{name}', using torch")
+        name = TorchBackend.name
+
+    if name == OnnxBackend.name:
+        try:
+            return OnnxBackend(modelName)
+        except Exception as e:
+            print(f"ONNX backend unavailable ({e}), using torch")
+            name = TorchBackend.name
+
+    return BACKENDS[name](modelName)
+
+
+def exportOnnxModel(modelName=None):
+    """
+    Export MiniLM (or the given sentence-transformers model) to ONNX and
+    quantize its weights to int8.
+    Development-time only: needs torch, sentence-transformers, onnx and onnxruntime.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    modelName = modelName or getSetting("embeddingModel")
+    modelDir = getOnnxModelDir(modelName)
+    os.makedirs(modelDir, exist_ok=True)
+
+    model = SentenceTransformer(modelName, device="cpu")
+    transformer = model[0].auto_model
+    tokenizer = model.tokenizer
+    transformer.eval()
+
+    sample = tokenizer(["example text"], return_tensors="pt")
+    inputNames = ["input_ids", "attention_mask", "token_type_ids"]
+    dynamicAxes = {name: {0: "batch", 1: "sequence"} for name in inputNames}
+    dynamicAxes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    fp32Path = os.path.join(modelDir, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"]),
+            fp32Path,
+            input_names=inputNames,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamicAxes,
+            opset_version=14
+        )
+
+    quantize_dynamic(fp32Path, os.path.join(modelDir, "model_int8.onnx"), weight_type=QuantType.QInt8)
+    os.remove(fp32Path)
+
+    # Writes tokenizer.json, which is all OnnxBackend needs to tokenize
+    tokenizer.save_pretrained(modelDir)
+
+    return modelDir
+
+
+def compareBackends(reference, candidate, emailTexts, jobTexts):
+    """
+    Check that candidate picks the same best job per email as reference.
+    Returns the top-1 agreement rate and the largest score difference.
+    """
+    def scores(backend):
+        emails = backend.encode(emailTexts)
+        jobs = backend.encode(jobTexts)
+        emails /= np.clip(np.linalg.norm(emails, axis=1, keepdims=True), 1e-12, None)
+        jobs /= np.clip(np.linalg.norm(jobs, axis=1, keepdims=True), 1e-12, None)
+        return emails @ jobs.T
+
+    referenceScores = scores(reference)
+    candidateScores = scores(candidate)
+
+    agreement = referenceScores.argmax(axis=1) == candidateScores.argmax(axis=1)
+
+    return {
+        "top1Agreement": float(agreement.mean()) if len(agreement) else 1.0,
+        "maxScoreDiff": float(np.abs(referenceScores - candidateScores).max()) if referenceScores.size else 0.0,
+    }
+
+
+# -------------------------
+# Shared instance
+# -------------------------
+
+# Process-wide model state. The backend is only ever loaded once; every
+# caller shares the same instance.
+_model = None
+_modelState = "idle"          # idle -> loading -> ready | failed
+_loadLock = threading.Lock()
+_stateLock = threading.Lock()
+
+
+def _setState(state):
+    global _modelState
+    with _stateLock:
+        _modelState = state
+
+
+def getModelState():
+    """
+    Return the current state of the shared model:
+    "idle", "loading", "ready" or "failed".
+    """
+    with _stateLock:
+        return _modelState
+
+
+def getModelId():
+    """
+    Identifies which model/backend produced an embedding, so caches built by
+    one backend are never mixed with vectors from another.
+    """
+    if _model is not None:
+        return f"{_model.modelName}:{_model.name}"
+    return f"{getSetting('embeddingModel')}:{getSetting('embeddingBackend')}"
+
+
+def getModel():
+    """
+    Return the shared embedding backend, loading it on first use.
+    If a background warm-up is already running this blocks until it finishes
+    instead of loading a second copy.
+    """
+    global _model
+
+    if _model is not None:
+        return _model
+
+    with _loadLock:
+        if _model is None:
+            _setState("loading")
+            try:
+                _model = createBackend()
+            except Exception:
+                _setState("failed")
+                raise
+            _setState("ready")
+
+    return _model
+
+
+def warmModel(onDone=None):
+    """
+    Start loading the shared model in a daemon thread.
+    onDone(state) is called from that thread once loading ends (or right away
+    if the model is already loaded).
+    """
+    if _model is not None:
+        if onDone:
+            onDone("ready")
+        return
+
+    def worker():
+        try:
+            getModel()
+        except Exception as e:
+            print(f"Failed to load embedding model: {e}")
+        if onDone:
+            onDone(getModelState())
+
+    _setState("loading")
+    threading.Thread(target=worker, daemon=True).start()
@@ -0,0 +1,127 @@
+import multiprocessing
+import os
+
+import numpy as np
+
+from app.embedding_model import createBackend
+from app.settings import getSetting
+
+
+# Texts per progress update / per job sent to a worker
+PROGRESS_BATCH_SIZE = 256
+
+# Model owned by the current worker process
+_workerModel = None
+
+
+def _initWorker(backendName, modelName, threadsPerWorker):
+    global _workerModel
+
+    # Keep workers from each grabbing every core for their own math threads
+    os.environ["OMP_NUM_THREADS"] = str(threadsPerWorker)
+    os.environ["MKL_NUM_THREADS"] = str(threadsPerWorker)
+
+    _workerModel = createBackend(backendName, modelName)
+
+
+def _encodeBatch(job):
+    start, texts, batchSize = job
+    return start, _workerModel.encode(texts, batch_size=batchSize)
+
+
+def getWorkerCount():
+    workers = getSetting("embedWorkers")
+    if workers == "auto":
+        workers = max((os.cpu_count() or 1) - 1, 1)
+    return int(workers)
+
+
+def _encodeInProcess(model, texts, batchSize, onProgress):
+    total = len(texts)
+    parts = []
+    for start in range(0, total, PROGRESS_BATCH_SIZE):
+        parts.append(model.encode(texts[start:start + PROGRESS_BATCH_SIZE], batch_size=batchSize))
+        if onProgress:
+            onProgress(min(start + PROGRESS_BATCH_SIZE, total), total)
+    return np.vstack(parts).astype(np.float32) if parts else np.zeros((0, 0), dtype=np.float32)
+
+
+class EncoderPool:
+    """
+    Encodes texts for one run, moving to a pool of worker processes (each
+    with its own model) once the run has encoded parallelMinTexts texts and
+    the embedWorkers setting allows it.
+
+    The pool is started at most once and then fed every later batch, so a
+    run that arrives as many small batches pays the worker start-up and
+    model loading only once. close() shuts it down.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.workers = getWorkerCount()
+        self.pool = None
+        self.textsSeen = 0
+
+    def _start(self):
+        threadsPerWorker = max((os.cpu_count() or 1) // self.workers, 1)
+        # spawn works the same on every OS and inside the PyInstaller build
+        context = multiprocessing.get_context("spawn")
+        self.pool = context.Pool(
+            processes=self.workers,
+            initializer=_initWorker,
+            initargs=(self.model.name, self.model.modelName, threadsPerWorker)
+        )
+
+    def encode(self, texts, batchSize=32, onProgress=None):
+        """
+        Encode texts, reporting onProgress(done, total) as batches finish.
+        The rows come back in input order.
+        """
+        self.textsSeen += len(texts)
+
+        if self.pool is None:
+            if self.workers <= 1 or self.textsSeen < getSetting("parallelMinTexts"):
+                return _encodeInProcess(self.model, texts, batchSize, onProgress)
+            self._start()
+
+        total = len(texts)
+        jobs = [
+            (start, texts[start:start + PROGRESS_BATCH_SIZE], batchSize)
+            for start in range(0, total, PROGRESS_BATCH_SIZE)
+        ]
+
+        embeddings = None
+        done = 0
+
+        for start, batch in self.pool.imap_unordered(_encodeBatch, jobs):
+            if embeddings is None:
+                embeddings = np.empty((total, batch.shape[1]), dtype=np.float32)
+            embeddings[start:start + len(batch)] = batch
+
+            done += len(batch)
+            if onProgress:
+                onProgress(done, total)
+
+        return embeddings if embeddings is not None else np.zeros((0, 0), dtype=np.float32)
+
+    def close(self):
+        if self.pool is not None:
+            # Nothing is left to encode (or the run was cancelled mid-batch)
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+
+def encodeTexts(model, texts, batchSize=32, onProgress=None):
+    """
+    Encode texts once, reporting onProgress(done, total) as batches finish.
+
+    Large lists are fanned out over worker processes like EncoderPool does;
+    callers encoding several batches should keep one EncoderPool instead.
+    """
+    pool = EncoderPool(model)
+    try:
+        return pool.encode(texts, batchSize=batchSize, onProgress=onProgress)
+    finally:
+        pool.close()
@@ -0,0 +1,191 @@
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+from app.paths import get_data_path
+from app.embedding_model import getModelId
+from app.ann_index import IvfIndex
+from app.scoring import l2Normalize
+from app.settings import getSetting
+from app.storage import atomicReplace
+
+
+jobEmbeddingsFilePath = get_data_path("data/embeddings/job_embeddings.npy")
+jobEmbeddingsIndexFilePath = get_data_path("data/embeddings/job_index.json")
+jobAnnIndexFilePath = get_data_path("data/embeddings/job_ann.npz")
+
+# A matching run, matchNewJob and job search may each hold a cache and save
+# it from their own thread; one writer at a time keeps the files paired
+_saveLock = threading.RLock()
+
+
+def hashText(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class JobEmbeddingCache:
+    """
+    On-disk store of job embeddings.
+
+    Embeddings live in a single .npy matrix and job_index.json maps the hash
+    of each (normalized) job text to its row. Each text is only ever encoded
+    once; new or edited jobs are encoded incrementally and appended. An
+    optional IVF index over the rows is kept next to it for large job lists.
+
+    Rows are held in memory as unit-length float32, so scoring is a plain dot
+    product. On disk they can be stored as float16 to halve the file size.
+    """
+
+    def __init__(self):
+        self.rows = {}
+        self.embeddings = None
+        self.ann = None
+        self._load()
+
+    def _load(self):
+        if not (os.path.exists(jobEmbeddingsFilePath) and os.path.exists(jobEmbeddingsIndexFilePath)):
+            return
+
+        try:
+            # Not halfway through another thread's save
+            with _saveLock:
+                with open(jobEmbeddingsIndexFilePath, "r") as f:
+                    index = json.load(f)
+                embeddings = np.load(jobEmbeddingsFilePath)
+        except Exception as e:
+            print(f"Discarding unreadable job embedding cache: {e}")
+            return
+
+        # Embeddings from a different model/backend can't be mixed with new ones
+        if index.get("model") != getModelId() or len(embeddings) != len(index.get("rows", {})):
+            return
+
+        self.rows = index["rows"]
+        # Older caches weren't normalized, and float16 rows lose a little of
+        # their unit length, so normalize once here
+        self.embeddings = l2Normalize(embeddings)
+
+        if os.path.exists(jobAnnIndexFilePath):
+            try:
+                ann = IvfIndex.load(jobAnnIndexFilePath)
+                if len(ann) == len(embeddings):
+                    self.ann = ann
+            except Exception as e:
+                print(f"Discarding unreadable ANN index: {e}")
+
+    def _save(self):
+        # Written to temp files first so a crash can't leave a half-written cache
+        with _saveLock:
+            with atomicReplace(jobEmbeddingsFilePath) as tmpPath:
+                with open(tmpPath, "wb") as f:
+                    np.save(f, self.embeddings.astype(np.float16) if getSetting("jobEmbeddingsFloat16") else self.embeddings)
+
+            with atomicReplace(jobEmbeddingsIndexFilePath) as tmpPath:
+                with open(tmpPath, "w") as f:
+                    json.dump({"model": getModelId(), "rows": self.rows}, f)
+
+            self._saveAnn()
+
+    def _saveAnn(self):
+        with _saveLock:
+            if self.ann is None:
+                if os.path.exists(jobAnnIndexFilePath):
+                    os.remove(jobAnnIndexFilePath)
+                return
+
+            with atomicReplace(jobAnnIndexFilePath) as tmpPath:
+                self.ann.save(tmpPath)
+
+    def _compact(self, liveHashes):
+        """Drop rows for job texts that no longer exist."""
+        keep = [h for h in self.rows if h in liveHashes]
+        keepRows = [self.rows[h] for h in keep]
+
+        self.embeddings = self.embeddings[keepRows]
+        self.rows = {h: i for i, h in enumerate(keep)}
+
+        # Row numbers changed, so the ANN index has to be rebuilt
+        self.ann = None
+
+    def _encodeMissing(self, model, jobTexts, compact):
+        """
+        Encode the texts that aren't cached yet and return the hash of every
+        text in jobTexts. With compact, jobTexts must be every live job.
+        """
+        hashes = [hashText(t) for t in jobTexts]
+
+        missing = {}
+        for h, text in zip(hashes, jobTexts):
+            if h not in self.rows and h not in missing:
+                missing[h] = text
+
+        changed = False
+
+        if missing:
+            newEmbeddings = l2Normalize(model.encode(list(missing.values())))
+
+            start = 0 if self.embeddings is None else len(self.embeddings)
+            for i, h in enumerate(missing):
+                self.rows[h] = start + i
+
+            if self.embeddings is None:
+                self.embeddings = newEmbeddings
+            else:
+                self.embeddings = np.vstack([self.embeddings, newEmbeddings])
+
+            # Keep the ANN index in step without retraining it
+            if self.ann is not None:
+                self.ann.add(newEmbeddings)
+            changed = True
+
+        # Edited/deleted jobs leave stale rows behind; drop them once they
+        # make up more than half the cache
+        liveHashes = set(hashes)
+        if compact and len(self.rows) > 2 * len(liveHashes):
+            self._compact(liveHashes)
+            changed = True
+
+        if changed:
+            self._save()
+
+        return hashes
+
+    def getEmbeddings(self, model, jobTexts, compact=False):
+        """
+        Return an embedding matrix whose rows line up with jobTexts,
+        encoding only the texts that aren't cached yet.
+
+        Only pass compact=True with the full job list: rows of texts not in
+        jobTexts may then be dropped.
+        """
+        hashes = self._encodeMissing(model, jobTexts, compact)
+
+        if not hashes:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        return self.embeddings[[self.rows[h] for h in hashes]]
+
+    def getRows(self, model, jobTexts, compact=False):
+        """
+        Return the cache row of each text in jobTexts, encoding any new ones.
+        compact works as in getEmbeddings.
+        """
+        hashes = self._encodeMissing(model, jobTexts, compact)
+        return np.array([self.rows[h] for h in hashes], dtype=np.int64)
+
+    def getAnnIndex(self):
+        """
+        Return an IVF index over every cached row, training it on first use
+        or once the cache has outgrown the data it was trained on.
+        """
+        if self.embeddings is None or len(self.embeddings) == 0:
+            return None
+
+        if self.ann is None or self.ann.needsRetraining():
+            self.ann = IvfIndex.train(self.embeddings)
+            self._saveAnn()
+
+        return self.ann
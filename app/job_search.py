@@ -0,0 +1,209 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+from app.paths import get_data_path
+from app.embedding_model import getModel, getModelId
+from app.email_text import chunkTokens, normalize
+from app.embed import formatJobText
+from app.job_embedding_cache import JobEmbeddingCache, jobEmbeddingsIndexFilePath
+from app.scoring import l2Normalize
+from app.settings import getSetting
+from app.storage import atomicReplace, writeJsonAtomic
+
+
+pulledTextFilesDirPath = get_data_path("data/pulledTextFiles")
+descriptionIndexFilePath = get_data_path("data/embeddings/description_index.json")
+descriptionEmbeddingsFilePath = get_data_path("data/embeddings/description_embeddings.npy")
+
+# Description index files are written by one thread at a time
+_saveLock = threading.Lock()
+
+# Long descriptions are embedded as several chunks; a job scores its best one
+DESCRIPTION_CHUNK_TOKENS = 200
+MAX_DESCRIPTION_CHUNKS = 8
+
+
+def _fileState(path):
+    stat = os.stat(path)
+    return [stat.st_mtime, stat.st_size]
+
+
+class DescriptionIndex:
+    """
+    Embeddings of the pulled job description files, cached on disk.
+
+    Each file is split into chunks that are embedded once; a file is only
+    re-encoded when its modification time or size changes. Rows are stored
+    unit length, so scoring a query is one matrix-vector product.
+    """
+
+    def __init__(self):
+        # filename -> {"state": [mtime, size], "rows": [start, count]}
+        self.files = {}
+        self.embeddings = np.zeros((0, 0), dtype=np.float32)
+        self._load()
+
+    def _load(self):
+        if not (os.path.exists(descriptionIndexFilePath) and os.path.exists(descriptionEmbeddingsFilePath)):
+            return
+
+        try:
+            with open(descriptionIndexFilePath, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            embeddings = np.load(descriptionEmbeddingsFilePath)
+        except Exception as e:
+            print(f"Discarding unreadable description index: {e}")
+            return
+
+        if data.get("model") != getModelId():
+            return
+
+        files = data.get("files", {})
+        if any(f["rows"][0] + f["rows"][1] > len(embeddings) for f in files.values()):
+            return
+
+        self.files = files
+        self.embeddings = embeddings
+
+    def _save(self):
+        with _saveLock:
+            with atomicReplace(descriptionEmbeddingsFilePath) as tmpPath:
+                with open(tmpPath, "wb") as f:
+                    np.save(f, self.embeddings)
+
+            writeJsonAtomic(descriptionIndexFilePath, {"model": getModelId(), "files": self.files})
+
+    def _compact(self):
+        rows = []
+        for entry in self.files.values():
+            start, count = entry["rows"]
+            entry["rows"] = [len(rows), count]
+            rows.extend(range(start, start + count))
+        self.embeddings = self.embeddings[rows]
+
+    def sync(self, model, filenames):
+        """Encode files that are new or changed since they were last indexed."""
+        stale = []
+        for name in set(filenames):
+            path = os.path.join(pulledTextFilesDirPath, name)
+            try:
+                state = _fileState(path)
+            except OSError:
+                continue
+            entry = self.files.get(name)
+            if entry is None or entry["state"] != state:
+                stale.append((name, path, state))
+
+        if not stale:
+            return
+
+        texts = []
+        counts = []
+        for name, path, state in stale:
+            try:
+                with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                    text = normalize(f.read())
+                chunks = [c for c in chunkTokens(text, DESCRIPTION_CHUNK_TOKENS, MAX_DESCRIPTION_CHUNKS) if c]
+            except OSError as e:
+                print(f"Skipping unreadable description {name}: {e}")
+                chunks = []
+            texts.extend(chunks)
+            counts.append(len(chunks))
+
+        start = len(self.embeddings)
+        if texts:
+            vectors = l2Normalize(model.encode(texts))
+            self.embeddings = vectors if start == 0 else np.vstack([self.embeddings, vectors])
+
+        for (name, _, state), count in zip(stale, counts):
+            self.files[name] = {"state": state, "rows": [start, count]}
+            start += count
+
+        # Drop files that are gone, and rows left behind by edited ones once
+        # they make up more than half the matrix
+        live = set(filenames)
+        for name in [name for name in self.files if name not in live]:
+            del self.files[name]
+        if 2 * sum(f["rows"][1] for f in self.files.values()) < len(self.embeddings):
+            self._compact()
+
+        self._save()
+
+    def scores(self, queryEmbedding):
+        """Return each indexed file's best chunk similarity to the query."""
+        if not len(self.embeddings):
+            return {}
+
+        chunkScores = self.embeddings @ queryEmbedding
+
+        scores = {}
+        for name, entry in self.files.items():
+            start, count = entry["rows"]
+            if count:
+                scores[name] = float(chunkScores[start:start + count].max())
+        return scores
+
+
+class JobSearch:
+    """
+    Ranks saved jobs by meaning rather than substring match.
+
+    A job scores the better of its "Company | Role" text and its pulled
+    description. Both are embedded once and cached, so a query only costs
+    one encoder call and a dot product per job.
+    """
+
+    def __init__(self):
+        self.descriptions = DescriptionIndex()
+        self.jobCache = None
+        self.jobCacheState = None
+        # Searches fired by quick typing may overlap; the index isn't shared safely
+        self._lock = threading.Lock()
+
+    def _cacheState(self):
+        try:
+            return _fileState(jobEmbeddingsIndexFilePath)
+        except OSError:
+            return None
+
+    def _jobEmbeddings(self, model, jobs):
+        # Kept between searches; only reloaded when a matching run wrote the cache since
+        if self.jobCache is None or self._cacheState() != self.jobCacheState:
+            self.jobCache = JobEmbeddingCache()
+        embeddings = self.jobCache.getEmbeddings(model, [normalize(formatJobText(job)) for job in jobs])
+        self.jobCacheState = self._cacheState()
+        return embeddings
+
+    def search(self, query, jobs):
+        """
+        Return (jobIndex, score) pairs for jobs scoring at least the
+        "semanticSearchMinScore" setting, best first.
+
+        jobs must be every saved job: descriptions of jobs not passed are
+        dropped from the index. Filter the results instead.
+        """
+        if not jobs or not query.strip():
+            return []
+
+        model = getModel()
+
+        with self._lock:
+            self.descriptions.sync(model, [job["text_file"] for job in jobs if job.get("text_file")])
+            titleEmbeddings = self._jobEmbeddings(model, jobs)
+
+            queryEmbedding = l2Normalize(model.encode([normalize(query)]))[0]
+            titleScores = titleEmbeddings @ queryEmbedding
+            descriptionScores = self.descriptions.scores(queryEmbedding)
+
+        minScore = getSetting("semanticSearchMinScore")
+        results = []
+        for j, job in enumerate(jobs):
+            score = max(float(titleScores[j]), descriptionScores.get(job.get("text_file"), -1.0))
+            if score >= minScore:
+                results.append((j, score))
+
+        results.sort(key=lambda item: item[1], reverse=True)
+        return results
@@ -0,0 +1,120 @@
+import re
+from collections import defaultdict
+
+
+# Corporate suffixes and filler words that shouldn't decide a company match
+COMPANY_STOPWORDS = {
+    "inc", "llc", "ltd", "limited", "corp", "corporation", "co", "company",
+    "the", "group", "plc", "gmbh", "holdings", "and", "of",
+}
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+MIN_COMPANY_LENGTH = 3
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def companyTokens(company):
+    tokens = [t for t in tokenize(company) if t not in COMPANY_STOPWORDS]
+    # A company that is nothing but stopwords still needs something to match on
+    return tuple(tokens or tokenize(company))
+
+
+def emailEvidence(email):
+    """Subject and sender of an email, where a company name is rarely incidental."""
+    return " ".join(filter(None, [email.get("subject"), email.get("from")]))
+
+
+def _containsPhrase(tokens, phrase):
+    n = len(phrase)
+    first = phrase[0]
+    for i in range(len(tokens) - n + 1):
+        if tokens[i] == first and tuple(tokens[i:i + n]) == phrase:
+            return True
+    return False
+
+
+class JobLexicalIndex:
+    """
+    Inverted index over normalized company and title tokens of the saved jobs.
+
+    match() resolves emails that name a single saved company outright, using
+    title overlap to pick between several jobs at the same company. Anything
+    ambiguous returns None so the caller can fall back to embeddings.
+
+    A one-word company name is often an ordinary word too ("unable to
+    provide visa sponsorship", "a better match for the role"), so it only
+    counts when it also appears in the subject or sender.
+    """
+
+    def __init__(self, jobs):
+        self.companies = []
+        self.titles = []
+        self.index = defaultdict(set)
+
+        for j, job in enumerate(jobs):
+            phrase = companyTokens(job.get("company", ""))
+            title = set(tokenize(job.get("title", ""))) - COMPANY_STOPWORDS
+
+            self.companies.append(phrase)
+            self.titles.append(title)
+
+            if len("".join(phrase)) < MIN_COMPANY_LENGTH:
+                continue
+
+            # Index the first token of the phrase, plus the phrase written as
+            # one word so "JP Morgan" also matches "jpmorgan"
+            self.index[phrase[0]].add(j)
+            if len(phrase) > 1:
+                self.index["".join(phrase)].add(j)
+
+    def _companyHits(self, tokens, tokenSet, evidenceSet):
+        candidates = set()
+        for token in tokenSet:
+            candidates |= self.index.get(token, set())
+
+        hits = defaultdict(list)
+        for j in candidates:
+            phrase = self.companies[j]
+            if _containsPhrase(tokens, phrase) or (len(phrase) > 1 and "".join(phrase) in tokenSet):
+                hits[phrase].append(j)
+
+        # "Meta" and "Meta Platforms" both hitting means Meta Platforms
+        for phrase in list(hits):
+            if any(other != phrase and len(other) > len(phrase) and _containsPhrase(other, phrase) for other in hits):
+                del hits[phrase]
+
+        for phrase in list(hits):
+            if len(phrase) == 1 and phrase[0] not in evidenceSet:
+                del hits[phrase]
+
+        return hits
+
+    def match(self, text, evidence=""):
+        """
+        Return the matching job index, or None if there's no unambiguous hit.
+        evidence is the email's subject and sender (see emailEvidence).
+        """
+        tokens = tokenize(text)
+        tokenSet = set(tokens)
+
+        hits = self._companyHits(tokens, tokenSet, set(tokenize(evidence)))
+        if len(hits) != 1:
+            return None
+
+        jobs = next(iter(hits.values()))
+        if len(jobs) == 1:
+            return jobs[0]
+
+        # Several applications at the same company: pick by title overlap
+        def titleOverlap(j):
+            title = self.titles[j]
+            return len(title & tokenSet) / len(title) if title else 0.0
+
+        ranked = sorted(jobs, key=titleOverlap, reverse=True)
+        if titleOverlap(ranked[0]) > titleOverlap(ranked[1]):
+            return ranked[0]
+        return None
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from app.paths import get_data_path
+from app.embedding_model import getModelId
+from app.storage import writeJsonAtomic
+
+
+matchCacheFilePath = get_data_path("data/embeddings/match_cache.json")
+matchCacheEmbeddingsFilePath = get_data_path("data/embeddings/match_cache_embeddings.npy")
+
+# Job-set versions remembered for incremental rescoring
+MAX_VERSIONS = 8
+MAX_ENTRIES = 20000
+
+
+def emailTextKey(texts):
+    """Hash of the prepared text chunks of an email."""
+    return hashlib.sha1("\x1e".join(texts).encode("utf-8")).hexdigest()
+
+
+def jobSetVersion(jobKeys):
+    """Version stamp for a set of job text hashes; order doesn't matter."""
+    return hashlib.sha1("".join(sorted(set(jobKeys))).encode("utf-8")).hexdigest()
+
+
+class MatchCache:
+    """
+    Top-k (job text hash, score) results per email, stamped with the version
+    of the job set they were scored against, plus the email's chunk
+    embeddings.
+
+    A result for the current version is reused as is. A result for an older
+    version is brought up to date by dropping removed jobs and scoring the
+    email only against jobs added since, so a small edit to the job list
+    doesn't mean rescoring every email.
+    """
+
+    def __init__(self):
+        self.versions = {}
+        self.entries = {}
+        self.embeddings = np.zeros((0, 0), dtype=np.float32)
+        self._newEmbeddings = []
+        self._newRowCount = 0
+        self._load()
+
+    def _load(self):
+        if not (os.path.exists(matchCacheFilePath) and os.path.exists(matchCacheEmbeddingsFilePath)):
+            return
+
+        try:
+            with open(matchCacheFilePath, "r") as f:
+                data = json.load(f)
+            embeddings = np.load(matchCacheEmbeddingsFilePath)
+        except Exception as e:
+            print(f"Discarding unreadable match cache: {e}")
+            return
+
+        if data.get("model") != getModelId():
+            return
+
+        entries = data.get("entries", {})
+        if any(e["rows"][0] + e["rows"][1] > len(embeddings) for e in entries.values()):
+            return
+
+        self.versions = {v: set(keys) for v, keys in data.get("versions", {}).items()}
+        self.entries = entries
+        self.embeddings = embeddings
+
+    def save(self):
+        self._stackNew()
+        self._compact()
+
+        os.makedirs(os.path.dirname(matchCacheEmbeddingsFilePath), exist_ok=True)
+        tmpPath = matchCacheEmbeddingsFilePath + ".tmp"
+        with open(tmpPath, "wb") as f:
+            np.save(f, self.embeddings)
+        os.replace(tmpPath, matchCacheEmbeddingsFilePath)
+
+        writeJsonAtomic(matchCacheFilePath, {
+            "model": getModelId(),
+            "versions": {v: sorted(keys) for v, keys in self.versions.items()},
+            "entries": self.entries,
+        })
+
+    def _compact(self):
+        # Drop the oldest entries beyond the cap
+        overflow = len(self.entries) - MAX_ENTRIES
+        for key in list(self.entries)[:max(overflow, 0)]:
+            del self.entries[key]
+
+        # Replaced entries leave unused rows behind
+        used = sum(e["rows"][1] for e in self.entries.values())
+        if used * 2 >= len(self.embeddings):
+            return
+
+        rows = []
+        start = 0
+        for entry in self.entries.values():
+            first, count = entry["rows"]
+            rows.extend(range(first, first + count))
+            entry["rows"] = [start, count]
+            start += count
+        self.embeddings = self.embeddings[rows]
+
+    def registerVersion(self, version, jobKeys):
+        if version in self.versions:
+            return
+        self.versions[version] = set(jobKeys)
+        while len(self.versions) > MAX_VERSIONS:
+            del self.versions[next(iter(self.versions))]
+
+    def get(self, emailKey):
+        return self.entries.get(emailKey)
+
+    def embeddingFor(self, entry):
+        self._stackNew()
+        first, count = entry["rows"]
+        return self.embeddings[first:first + count]
+
+    def jobKeysFor(self, version):
+        return self.versions.get(version)
+
+    def put(self, emailKey, version, topk, embedding):
+        embedding = np.asarray(embedding, dtype=np.float32)
+
+        # Stacked lazily, so many puts don't each copy the whole matrix
+        start = len(self.embeddings) + self._newRowCount
+        self._newEmbeddings.append(embedding)
+        self._newRowCount += len(embedding)
+
+        # Re-inserted so the newest entries survive the cap
+        self.entries.pop(emailKey, None)
+        self.entries[emailKey] = {
+            "version": version,
+            "topk": [[key, float(score)] for key, score in topk],
+            "rows": [start, len(embedding)],
+        }
+
+    def _stackNew(self):
+        if not self._newEmbeddings:
+            return
+        parts = ([self.embeddings] if len(self.embeddings) else []) + self._newEmbeddings
+        self.embeddings = np.vstack(parts)
+        self._newEmbeddings = []
+        self._newRowCount = 0
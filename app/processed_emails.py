@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+
+from app.paths import get_data_path
+from app.storage import writeJsonAtomic
+
+
+processedEmailsFilePath = get_data_path("data/processed_emails.txt")
+matchDecisionsFilePath = get_data_path("data/match_decisions.json")
+logsJsonFilePath = get_data_path("data/logs.json")
+
+
+def fallbackKey(subject, date):
+    """Key for emails without a message id (older log entries, other providers)."""
+    raw = f"{subject}\x1f{date}"
+    return "sd:" + hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def emailKeys(email):
+    """Every key an email may have been recorded under, most specific first."""
+    keys = []
+    if email.get("id"):
+        keys.append("id:" + email["id"])
+    keys.append(fallbackKey(email.get("subject"), email.get("date")))
+    return keys
+
+
+class ProcessedEmailIndex:
+    """
+    Set of emails that have already been run through the matcher.
+
+    Loaded once per run so each lookup is a set membership test. Persisted
+    as an append-only text file with one key per line: the Gmail message id
+    when there is one, otherwise a hash of subject + date.
+    """
+
+    def __init__(self):
+        self.keys = set()
+        self._unsaved = []
+        self._hasFallbackKeys = None
+        self._load()
+
+    def _load(self):
+        if os.path.exists(processedEmailsFilePath):
+            with open(processedEmailsFilePath, "r") as f:
+                self.keys = set(f.read().split())
+            return
+
+        # First run with the index: seed it from the emailsViewed log
+        if os.path.exists(logsJsonFilePath):
+            with open(logsJsonFilePath, "r") as f:
+                logs = json.load(f)
+            for email in logs.get("emailsViewed", []):
+                self.add(email)
+            self.save()
+
+    def contains(self, email):
+        return any(key in self.keys for key in emailKeys(email))
+
+    def containsId(self, messageId):
+        """Lookup by message id alone, before anything else about the email is known."""
+        return "id:" + messageId in self.keys
+
+    def hasFallbackKeys(self):
+        """Whether some emails are only known by subject + date."""
+        if self._hasFallbackKeys is None:
+            self._hasFallbackKeys = any(key.startswith("sd:") for key in self.keys)
+        return self._hasFallbackKeys
+
+    def add(self, email):
+        key = emailKeys(email)[0]
+        if key not in self.keys:
+            self.keys.add(key)
+            self._unsaved.append(key)
+            if key.startswith("sd:"):
+                self._hasFallbackKeys = True
+
+    def save(self):
+        if not self._unsaved:
+            return
+
+        os.makedirs(os.path.dirname(processedEmailsFilePath), exist_ok=True)
+        with open(processedEmailsFilePath, "a") as f:
+            f.write("\n".join(self._unsaved) + "\n")
+        self._unsaved = []
+
+
+class MatchDecisions:
+    """
+    What each processed email was matched to: the text hash of the job, or
+    None when it matched nothing. Re-checking processed emails compares
+    against this, so only emails whose match actually changed touch a job.
+    Emails processed before decisions were recorded are simply unknown.
+    """
+
+    def __init__(self):
+        self.decisions = {}
+        self._changed = False
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(matchDecisionsFilePath):
+            return
+        try:
+            with open(matchDecisionsFilePath, "r") as f:
+                self.decisions = json.load(f)
+        except Exception as e:
+            print(f"Discarding unreadable match decisions: {e}")
+
+    def isKnown(self, email):
+        return any(key in self.decisions for key in emailKeys(email))
+
+    def get(self, email):
+        """The recorded job hash (or None); check isKnown first."""
+        for key in emailKeys(email):
+            if key in self.decisions:
+                return self.decisions[key]
+        return None
+
+    def set(self, email, jobKey):
+        key = emailKeys(email)[0]
+        if self.decisions.get(key, False) != jobKey:
+            self.decisions[key] = jobKey
+            self._changed = True
+
+    def save(self):
+        if self._changed:
+            writeJsonAtomic(matchDecisionsFilePath, self.decisions)
+            self._changed = False
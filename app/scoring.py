@@ -0,0 +1,42 @@
+import numpy as np
+
+
+def l2Normalize(matrix):
+    """Rows scaled to unit length as float32; all-zero rows stay zero."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+
+def cosineScores(queries, normalizedTargets):
+    """
+    Cosine similarity of every query row to every target row.
+    Targets must already be unit length (as cached job embeddings are), so
+    only the queries are normalized here.
+    """
+    return l2Normalize(queries) @ normalizedTargets.T
+
+
+def maxPoolChunks(scores, chunkStarts):
+    """
+    Collapse per-chunk score rows to one row per email, keeping each email's
+    best chunk. chunkStarts gives the row of each email's first chunk.
+    """
+    if chunkStarts is None or len(chunkStarts) == len(scores):
+        return scores
+    return np.maximum.reduceat(scores, chunkStarts, axis=0)
+
+
+def topK(scores, k):
+    """
+    Return (indices, scores) of the k highest entries of a 1-D score array,
+    best first. Only the k winners are sorted.
+    """
+    scores = np.asarray(scores)
+    if len(scores) > k:
+        indices = np.argpartition(-scores, k - 1)[:k]
+    else:
+        indices = np.arange(len(scores))
+    indices = indices[np.argsort(-scores[indices], kind="stable")]
+    return indices, scores[indices]
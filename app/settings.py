@@ -0,0 +1,68 @@
+import json
+import os
+
+from app.paths import get_data_path
+
+
+settingsJsonFilePath = get_data_path("data/settings.json")
+
+# Settings users can override in data/settings.json
+DEFAULT_SETTINGS = {
+    # "torch" (sentence-transformers) or "onnx" (quantized ONNX Runtime on CPU)
+    "embeddingBackend": "torch",
+    # sentence-transformers model name
+    "embeddingModel": "all-MiniLM-L6-v2",
+    # Minimum cosine similarity for an email to update a job
+    "matchThreshold": 0.5,
+    # Approximate token budget for each email text sent to the encoder
+    "emailTokenBudget": 200,
+    # Split long emails into several chunks and keep each email's best chunk score
+    "chunkLongEmails": False,
+    "maxEmailChunks": 4,
+    # Use the approximate nearest-neighbour index once this many jobs are saved
+    "annMinJobs": 2000,
+    # Clusters searched per email and shortlist size re-ranked exactly
+    "annProbes": 8,
+    "annCandidates": 50,
+    # Store cached job embeddings as float16 on disk (scored as float32)
+    "jobEmbeddingsFloat16": False,
+    # Worker processes for encoding large email backlogs ("auto" = one per
+    # spare core, 0 or 1 = encode in the app process)
+    "embedWorkers": 0,
+    # Texts a run encodes in-process before starting the worker pool
+    "parallelMinTexts": 512,
+    # Unmatched emails kept for re-matching when new jobs are added
+    "maxUnmatchedEmails": 2000,
+    # Messages fetched per Gmail batch request (at most 100)
+    "gmailBatchSize": 50,
+    # "batch" (batch HTTP requests) or "concurrent" (parallel gets on pooled
+    # connections, capped by the per-user quota of 250 units per second)
+    "gmailFetchMode": "batch",
+    "gmailFetchWorkers": 8,
+    "gmailQuotaUnitsPerSecond": 250,
+    # Gmail REST endpoint used in concurrent mode; point at a local fake
+    # server for testing
+    "gmailApiBaseUrl": "https://gmail.googleapis.com",
+    # Lowest similarity a job can score and still show up in semantic search
+    "semanticSearchMinScore": 0.25,
+    # Matching trace written to data/traces: "off", "info" (stage timings)
+    # or "debug" (also each email's top job scores)
+    "traceLevel": "off",
+}
+
+
+def getSettings():
+    settings = dict(DEFAULT_SETTINGS)
+
+    if os.path.exists(settingsJsonFilePath):
+        try:
+            with open(settingsJsonFilePath, "r", encoding="utf-8") as f:
+                settings.update(json.load(f))
+        except Exception as e:
+            print(f"Error reading settings, using defaults: {e}")
+
+    return settings
+
+
+def getSetting(name):
+    return getSettings().get(name, DEFAULT_SETTINGS.get(name))
@@ -0,0 +1,45 @@
+import contextlib
+import json
+import os
+import tempfile
+
+
+def writeJsonAtomic(path, data, **dumpArgs):
+    """
+    Write data as JSON to path without ever leaving a half-written file.
+    The JSON goes to a temp file in the same folder which then replaces path.
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+
+    fd, tmpPath = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, **dumpArgs)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmpPath, path)
+    except BaseException:
+        if os.path.exists(tmpPath):
+            os.remove(tmpPath)
+        raise
+
+
+@contextlib.contextmanager
+def atomicReplace(path):
+    """
+    Yield a temp path, unique to this writer, in the same folder as path.
+    Once the block has written it, it replaces path; on error it's removed.
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+
+    fd, tmpPath = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.splitext(path)[1])
+    os.close(fd)
+    try:
+        yield tmpPath
+        os.replace(tmpPath, path)
+    except BaseException:
+        if os.path.exists(tmpPath):
+            os.remove(tmpPath)
+        raise
@@ -0,0 +1,86 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from app.paths import get_data_path
+from app.settings import getSetting
+
+
+tracesDirPath = get_data_path("data/traces")
+
+# "off" writes nothing, "info" records stage spans and run summaries,
+# "debug" adds each email's top-k job scores
+LEVELS = {"off": 0, "info": 1, "debug": 2}
+
+
+class Tracer:
+    """
+    Levelled trace of one matching run, written as JSON lines.
+
+    Every record has a type ("span" or "event"), a name, the time since the
+    run started and any extra fields. Spans also carry their duration, so a
+    trace can be summed per stage (load, extract, encode, score, commit).
+    Nothing is opened or written when the level is "off".
+    """
+
+    def __init__(self, level="off", path=None):
+        self.level = LEVELS.get(level, 0)
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+
+        if self.level and self.path is None:
+            os.makedirs(tracesDirPath, exist_ok=True)
+            stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+            self.path = os.path.join(tracesDirPath, f"match-{stamp}.jsonl")
+
+    def enabled(self, level="info"):
+        return self.level >= LEVELS[level]
+
+    def _write(self, record):
+        record["t"] = round(time.perf_counter() - self._start, 6)
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line + "\n")
+
+    def event(self, name, level="info", **fields):
+        if self.enabled(level):
+            self._write({"type": "event", "name": name, **fields})
+
+    @contextmanager
+    def span(self, name, level="info", **fields):
+        """
+        Time the enclosed block. Yields a dict that the block can add fields
+        to (counts, sizes) before the span is written.
+        """
+        if not self.enabled(level):
+            yield {}
+            return
+
+        start = time.perf_counter()
+        try:
+            yield fields
+        finally:
+            self._write({
+                "type": "span",
+                "name": name,
+                "ms": round((time.perf_counter() - start) * 1000, 3),
+                **fields
+            })
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def startTrace():
+    """Tracer for a new run at the level set by the "traceLevel" setting."""
+    return Tracer(getSetting("traceLevel"))
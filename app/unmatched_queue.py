@@ -0,0 +1,129 @@
+import json
+import os
+from email.utils import parsedate_to_datetime
+
+import numpy as np
+
+from app.paths import get_data_path
+from app.embedding_model import getModelId
+from app.scoring import cosineScores, l2Normalize, maxPoolChunks
+from app.settings import getSetting
+from app.storage import writeJsonAtomic
+
+
+unmatchedEmailsFilePath = get_data_path("data/unmatched/emails.json")
+unmatchedEmbeddingsFilePath = get_data_path("data/unmatched/embeddings.npy")
+
+
+def emailTimestamp(entry):
+    try:
+        return parsedate_to_datetime(entry.get("date")).timestamp()
+    except Exception:
+        return 0.0
+
+
+class UnmatchedEmailQueue:
+    """
+    Emails that didn't match any saved job, kept with their prepared text and
+    cached embeddings (one row per text chunk).
+
+    When a job is added only that job has to be scored against the queue, which
+    catches rejections that arrive before the application was logged. The
+    queue keeps the newest maxUnmatchedEmails entries.
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.embeddings = None
+        self._load()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _load(self):
+        if not os.path.exists(unmatchedEmailsFilePath):
+            return
+
+        try:
+            with open(unmatchedEmailsFilePath, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"Discarding unreadable unmatched email queue: {e}")
+            return
+
+        self.entries = data.get("entries", [])
+
+        # Embeddings from another model/backend are dropped and re-encoded
+        # from the stored text when they are next needed
+        if data.get("model") == getModelId() and os.path.exists(unmatchedEmbeddingsFilePath):
+            embeddings = np.load(unmatchedEmbeddingsFilePath)
+            if len(embeddings) == sum(len(e["texts"]) for e in self.entries):
+                self.embeddings = embeddings
+
+    def save(self):
+        os.makedirs(os.path.dirname(unmatchedEmbeddingsFilePath), exist_ok=True)
+
+        if self.embeddings is not None:
+            tmpPath = unmatchedEmbeddingsFilePath + ".tmp"
+            with open(tmpPath, "wb") as f:
+                np.save(f, self.embeddings)
+            os.replace(tmpPath, unmatchedEmbeddingsFilePath)
+        elif os.path.exists(unmatchedEmbeddingsFilePath):
+            os.remove(unmatchedEmbeddingsFilePath)
+
+        writeJsonAtomic(unmatchedEmailsFilePath, {"model": getModelId(), "entries": self.entries})
+
+    def _rowStarts(self):
+        counts = [len(e["texts"]) for e in self.entries]
+        return np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    def add(self, email, texts, embeddings):
+        """Queue an email with its prepared text chunks and their embeddings."""
+        if embeddings is None or (self.embeddings is None and self.entries):
+            # Vectors are all-or-nothing; without them the stored text is
+            # re-encoded the next time the queue is scored
+            self.embeddings = None
+            embeddings = None
+
+        self.entries.append({
+            "id": email.get("id"),
+            "subject": email.get("subject"),
+            "from": email.get("from"),
+            "date": email.get("date"),
+            "type": email["type"],
+            "texts": list(texts),
+        })
+
+        if embeddings is not None:
+            embeddings = np.asarray(embeddings, dtype=np.float32)
+            self.embeddings = embeddings if self.embeddings is None else np.vstack([self.embeddings, embeddings])
+
+        overflow = len(self.entries) - getSetting("maxUnmatchedEmails")
+        if overflow > 0:
+            self.remove(range(overflow))
+
+    def remove(self, indices):
+        indices = set(indices)
+        if not indices:
+            return
+
+        if self.embeddings is not None:
+            starts = self._rowStarts()
+            keepRows = np.concatenate([
+                np.arange(starts[i], starts[i + 1]) for i in range(len(self.entries)) if i not in indices
+            ] or [np.zeros(0, dtype=np.int64)])
+            self.embeddings = self.embeddings[keepRows]
+
+        self.entries = [e for i, e in enumerate(self.entries) if i not in indices]
+
+    def scoreJob(self, model, jobEmbedding):
+        """Return each queued email's best chunk similarity to one job."""
+        if not self.entries:
+            return np.zeros(0, dtype=np.float32)
+
+        if self.embeddings is None:
+            self.embeddings = model.encode([t for e in self.entries for t in e["texts"]])
+
+        chunkScores = cosineScores(self.embeddings, l2Normalize(jobEmbedding[None]))[:, 0]
+
+        return maxPoolChunks(chunkScores, self._rowStarts()[:-1])
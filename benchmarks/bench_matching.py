@@ -0,0 +1,186 @@
+"""
+Benchmark for the email-to-job matching engine.
+
+    python benchmarks/bench_matching.py --sizes 100 1000 10000 --backend torch
+
+Builds synthetic jobs_data.json and email lists at each size in a throwaway
+data folder and runs the matcher offline against the locally cached model.
+Reports model load time, encode throughput, scoring time and peak RSS, and
+writes them to a JSON file under benchmarks/results/ so releases can be
+compared.
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.paths import get_data_path
+from synthetic import makeJobs, makeEmails
+
+
+def isolateDataDir(tmpDir, backend):
+    """
+    Point the app's data folder at tmpDir so benchmarks never touch real
+    jobs or logs. Must run before any other app module is imported.
+    """
+    realModelsDir = get_data_path("data/models")
+
+    # Keep using the real model caches, without network access
+    home = os.path.expanduser("~")
+    os.environ.setdefault("HF_HOME", os.path.join(home, ".cache", "huggingface"))
+    os.environ["HF_HUB_OFFLINE"] = "1"
+    os.environ["TRANSFORMERS_OFFLINE"] = "1"
+
+    os.environ["HOME"] = tmpDir
+    os.environ["APPDATA"] = tmpDir
+
+    dataDir = get_data_path("data")
+    os.makedirs(dataDir, exist_ok=True)
+    if os.path.isdir(realModelsDir):
+        shutil.copytree(realModelsDir, os.path.join(dataDir, "models"))
+
+    with open(os.path.join(dataDir, "settings.json"), "w") as f:
+        json.dump({"embeddingBackend": backend}, f)
+
+    return dataDir
+
+
+def peakRssMb():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # bytes on macOS, kilobytes on Linux
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        pass
+
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1024 * 1024)
+    except ImportError:
+        return None
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def resetRunState(dataDir):
+    """
+    Forget processed emails, match decisions, the unmatched queue and cached
+    embeddings between sizes, so each size starts from an empty data folder.
+    """
+    for name in ["logs.json", "processed_emails.txt", "match_decisions.json"]:
+        path = os.path.join(dataDir, name)
+        if os.path.exists(path):
+            os.remove(path)
+    for name in ["embeddings", "unmatched"]:
+        shutil.rmtree(os.path.join(dataDir, name), ignore_errors=True)
+
+
+def benchmarkSize(size, dataDir, seed):
+    from app.embed import runEmbeddings, matchEmbeddings, getJobText, jobsDataJsonFilePath
+    from app.embedding_model import getModel
+    from app.embedding_pool import encodeTexts
+    from app.email_text import emailTextSettings, normalize, prepareEmailText
+    from app.job_embedding_cache import JobEmbeddingCache
+
+    resetRunState(dataDir)
+
+    jobs = makeJobs(size, seed)
+    emails, _ = makeEmails(jobs, size, seed)
+    with open(jobsDataJsonFilePath, "w", encoding="utf-8") as f:
+        json.dump(jobs, f)
+
+    model = getModel()
+    jobTexts = [normalize(t) for t in getJobText()]
+
+    jobEmbeddings, coldCacheSeconds = timed(JobEmbeddingCache().getEmbeddings, model, jobTexts)
+    _, warmCacheSeconds = timed(JobEmbeddingCache().getEmbeddings, model, jobTexts)
+
+    textSettings = emailTextSettings()
+    emailTexts, extractSeconds = timed(lambda: [t for e in emails for t in prepareEmailText(e, **textSettings)])
+    emailEmbeddings, encodeSeconds = timed(encodeTexts, model, emailTexts)
+    _, scoreSeconds = timed(matchEmbeddings, emailEmbeddings, jobEmbeddings)
+
+    # End to end, including the lexical stage and committing results. The
+    # job cache is warm at this point, as it would be after the first run.
+    with contextlib.redirect_stdout(io.StringIO()):
+        (_, emailsUpdated, stageCounts, _), runSeconds = timed(runEmbeddings, emails)
+
+    return {
+        "size": size,
+        "jobCacheColdSeconds": coldCacheSeconds,
+        "jobCacheWarmSeconds": warmCacheSeconds,
+        "extractSeconds": extractSeconds,
+        "encodeSeconds": encodeSeconds,
+        "encodeTextsPerSecond": len(emailTexts) / encodeSeconds if encodeSeconds else None,
+        "scoreSeconds": scoreSeconds,
+        "runEmbeddingsSeconds": runSeconds,
+        "emailsUpdated": emailsUpdated,
+        "stageCounts": stageCounts,
+        # Process high-water mark, so it includes every smaller size run before
+        "peakRssMb": peakRssMb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--backend", default="torch")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON file to write (default: benchmarks/results/<timestamp>.json)")
+    args = parser.parse_args()
+
+    tmpDir = tempfile.mkdtemp(prefix="trajecttower-bench-")
+    try:
+        dataDir = isolateDataDir(tmpDir, args.backend)
+
+        from app.embedding_model import getModel, getModelId
+
+        _, loadSeconds = timed(getModel)
+
+        report = {
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "model": getModelId(),
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpuCount": os.cpu_count(),
+            "modelLoadSeconds": loadSeconds,
+            "results": [],
+        }
+
+        for size in args.sizes:
+            result = benchmarkSize(size, dataDir, args.seed)
+            report["results"].append(result)
+            print(f"{size:>6} | encode {result['encodeTextsPerSecond']:.0f} texts/s | "
+                  f"score {result['scoreSeconds'] * 1000:.1f} ms | "
+                  f"run {result['runEmbeddingsSeconds']:.2f} s | peak RSS {result['peakRssMb']} MB")
+    finally:
+        shutil.rmtree(tmpDir, ignore_errors=True)
+
+    output = args.output or os.path.join(
+        ROOT, "benchmarks", "results",
+        "bench-" + datetime.datetime.now().strftime("%Y%m%d-%H%M%S") + ".json"
+    )
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
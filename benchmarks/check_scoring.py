@@ -0,0 +1,87 @@
+"""
+Parity check for app/scoring.py.
+
+    python benchmarks/check_scoring.py --emails 500 --jobs 2000
+
+Scores random embeddings with the matcher's scoring path (float32,
+pre-normalized jobs, argpartition top-k) and with a plain float64 cosine
+similarity plus a full sort, and fails if the scores differ by more than
+the tolerance or a top-k pick isn't one of the best jobs (up to ties
+within that tolerance). Also checks jobs that went through a float16
+round trip, as they do with "jobEmbeddingsFloat16" enabled. Needs numpy
+only.
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.embed import matchEmbeddings
+from app.scoring import l2Normalize, topK
+
+
+def referenceScores(emailEmbeddings, jobEmbeddings, chunkStarts):
+    emails = emailEmbeddings.astype(np.float64)
+    jobs = jobEmbeddings.astype(np.float64)
+    scores = (emails @ jobs.T) / np.outer(np.linalg.norm(emails, axis=1), np.linalg.norm(jobs, axis=1))
+    bounds = list(chunkStarts) + [len(emails)]
+    return np.array([scores[bounds[e]:bounds[e + 1]].max(axis=0) for e in range(len(chunkStarts))])
+
+
+def check(name, emailEmbeddings, jobEmbeddings, storedJobEmbeddings, chunkStarts, k, tolerance):
+    """Compare scoring storedJobEmbeddings (as loaded from the cache) to the reference on jobEmbeddings."""
+    expected = referenceScores(emailEmbeddings, jobEmbeddings, chunkStarts)
+    bestIndices, bestScores, scores = matchEmbeddings(emailEmbeddings, l2Normalize(storedJobEmbeddings), chunkStarts)
+
+    maxDiff = float(np.abs(scores - expected).max())
+    top1 = float((bestIndices == expected.argmax(axis=1)).mean())
+
+    topkAgreement = []
+    wrongPicks = 0
+    for row, expectedRow in zip(scores, expected):
+        indices, _ = topK(row, k)
+        expectedTop = np.sort(expectedRow)[::-1][:k]
+        topkAgreement.append(len(set(indices) & set(np.argsort(-expectedRow)[:k])) / k)
+        # A different pick is only wrong if it isn't a tie within tolerance
+        wrongPicks += int(np.any(np.sort(expectedRow[indices])[::-1] < expectedTop - tolerance))
+    topkAgreement = float(np.mean(topkAgreement))
+
+    ok = maxDiff <= tolerance and wrongPicks == 0
+    print(f"{name:<10} max score diff {maxDiff:.2e} | top-1 agreement {top1:.4f} | "
+          f"top-{k} agreement {topkAgreement:.4f} | {'ok' if ok else f'{wrongPicks} emails MISMATCH'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=500)
+    parser.add_argument("--jobs", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--chunks", type=int, default=3, help="Max chunks per email")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    jobEmbeddings = rng.standard_normal((args.jobs, args.dim)).astype(np.float32)
+    # Emails sit near a job, as real ones do, so the top scores are well separated
+    chunkCounts = rng.integers(1, args.chunks + 1, args.emails)
+    chunkStarts = np.concatenate([[0], np.cumsum(chunkCounts)[:-1]]).astype(np.int64)
+    targets = rng.integers(0, args.jobs, int(chunkCounts.sum()))
+    emailEmbeddings = (jobEmbeddings[targets] + 0.8 * rng.standard_normal((len(targets), args.dim))).astype(np.float32)
+
+    float16Jobs = l2Normalize(jobEmbeddings).astype(np.float16)
+
+    results = [
+        check("float32", emailEmbeddings, jobEmbeddings, jobEmbeddings, chunkStarts, args.k, 1e-5),
+        check("float16", emailEmbeddings, jobEmbeddings, float16Jobs, chunkStarts, args.k, 2e-3),
+    ]
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
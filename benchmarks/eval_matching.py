@@ -0,0 +1,176 @@
+"""
+Offline matching-quality vs latency evaluation.
+
+    python benchmarks/eval_matching.py --fixture benchmarks/fixtures/sample_eval.json \
+        --models all-MiniLM-L6-v2 --backends torch onnx --thresholds 0.3 0.4 0.5 0.6
+
+Runs every model/backend/threshold combination over a labelled fixture and
+prints precision, recall, false-update rate and ms/email side by side, with
+and without the lexical company stage. When several backends are given, each
+is also compared with the first one (e.g. onnx against torch): how often it
+picks the same best job and how far its scores drift. Nothing in the user's
+data folder is written.
+
+Fixture format (label is the index of the correct job, or null when the
+email shouldn't update anything):
+
+    {"jobs": [{"company": "...", "title": "..."}, ...],
+     "emails": [{"subject": "...", "body": "...", "type": "Rejected", "label": 0}, ...]}
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.embed import formatJobText, matchEmbeddings
+from app.embedding_model import compareBackends, createBackend
+from app.email_text import emailTextSettings, normalize, prepareEmailText
+from app.lexical_matcher import JobLexicalIndex, emailEvidence
+from app.scoring import l2Normalize
+from synthetic import makeJobs, makeEmails
+
+
+def loadFixture(args):
+    if args.synthetic:
+        jobs = makeJobs(args.synthetic, args.seed)
+        emails, labels = makeEmails(jobs, args.synthetic, args.seed)
+        return jobs, emails, labels
+
+    with open(args.fixture, "r", encoding="utf-8") as f:
+        fixture = json.load(f)
+    return fixture["jobs"], fixture["emails"], [e.get("label") for e in fixture["emails"]]
+
+
+def scoreFixture(backend, jobs, emails, useLexical):
+    """
+    Run the matcher's stages over the fixture once.
+    Returns (lexicalHits, bestIndices, bestScores, secondsPerEmail); the
+    threshold is applied afterwards so it can be swept for free.
+    """
+    jobTexts = [normalize(formatJobText(j)) for j in jobs]
+    # Job embeddings are cached in the app, so they aren't part of the per-email cost
+    jobEmbeddings = l2Normalize(backend.encode(jobTexts))
+
+    start = time.perf_counter()
+
+    textSettings = emailTextSettings()
+    emailChunks = [prepareEmailText(e, **textSettings) for e in emails]
+
+    lexicalHits = [None] * len(emails)
+    if useLexical:
+        lexical = JobLexicalIndex(jobs)
+        lexicalHits = [lexical.match(" ".join(chunks), emailEvidence(e)) for e, chunks in zip(emails, emailChunks)]
+
+    # As in the app, only emails the lexical stage left open are encoded
+    semantic = [i for i, hit in enumerate(lexicalHits) if hit is None]
+    bestIndices = np.full(len(emails), -1, dtype=np.int64)
+    bestScores = np.full(len(emails), -np.inf, dtype=np.float32)
+
+    if semantic:
+        texts = []
+        chunkStarts = []
+        for i in semantic:
+            chunkStarts.append(len(texts))
+            texts.extend(emailChunks[i])
+        emailEmbeddings = backend.encode(texts)
+        bestIndices[semantic], bestScores[semantic], _ = matchEmbeddings(emailEmbeddings, jobEmbeddings, chunkStarts)
+
+    seconds = time.perf_counter() - start
+    return lexicalHits, bestIndices, bestScores, seconds / max(len(emails), 1)
+
+
+def metrics(predictions, labels):
+    updates = sum(p is not None for p in predictions)
+    correct = sum(p is not None and p == l for p, l in zip(predictions, labels))
+    relevant = sum(l is not None for l in labels)
+
+    return {
+        "precision": correct / updates if updates else 1.0,
+        "recall": correct / relevant if relevant else 1.0,
+        # Share of all emails that would have changed the wrong job's status
+        "falseUpdateRate": (updates - correct) / len(labels) if labels else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixture", default=os.path.join(ROOT, "benchmarks", "fixtures", "sample_eval.json"))
+    parser.add_argument("--synthetic", type=int, help="Use N synthetic jobs/emails instead of a fixture")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--models", nargs="+", default=["all-MiniLM-L6-v2"])
+    parser.add_argument("--backends", nargs="+", default=["torch"])
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.3, 0.4, 0.5, 0.6])
+    parser.add_argument("--output", help="Also write the results as JSON")
+    args = parser.parse_args()
+
+    jobs, emails, labels = loadFixture(args)
+    rows = []
+    parity = []
+
+    jobTexts = [normalize(formatJobText(j)) for j in jobs]
+    emailTexts = [prepareEmailText(e)[0] for e in emails]
+
+    for model in args.models:
+        reference = None
+        for backendName in args.backends:
+            backend = createBackend(backendName, model)
+            if backend.name != backendName:
+                print(f"Skipping {model}/{backendName}: backend unavailable")
+                continue
+
+            if reference is None:
+                reference = backend
+            else:
+                parity.append({
+                    "model": model,
+                    "backend": backendName,
+                    "reference": reference.name,
+                    **compareBackends(reference, backend, emailTexts, jobTexts),
+                })
+
+            for useLexical in [True, False]:
+                lexicalHits, bestIndices, bestScores, secondsPerEmail = scoreFixture(backend, jobs, emails, useLexical)
+
+                for threshold in args.thresholds:
+                    predictions = [
+                        hit if hit is not None else (int(best) if score >= threshold else None)
+                        for hit, best, score in zip(lexicalHits, bestIndices, bestScores)
+                    ]
+                    rows.append({
+                        "model": model,
+                        "backend": backendName,
+                        "lexical": useLexical,
+                        "threshold": threshold,
+                        **metrics(predictions, labels),
+                        "msPerEmail": secondsPerEmail * 1000,
+                    })
+
+    header = f"{'model':<28} {'backend':<8} {'lexical':<8} {'thresh':>6} {'prec':>6} {'recall':>6} {'false':>6} {'ms/email':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        print(f"{r['model']:<28} {r['backend']:<8} {str(r['lexical']):<8} {r['threshold']:>6.2f} "
+              f"{r['precision']:>6.2f} {r['recall']:>6.2f} {r['falseUpdateRate']:>6.2f} {r['msPerEmail']:>9.2f}")
+
+    if parity:
+        print()
+        header = f"{'model':<28} {'backend':<8} {'vs':<8} {'top-1 agree':>11} {'max diff':>9}"
+        print(header)
+        print("-" * len(header))
+        for p in parity:
+            print(f"{p['model']:<28} {p['backend']:<8} {p['reference']:<8} "
+                  f"{p['top1Agreement']:>11.4f} {p['maxScoreDiff']:>9.4f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"emails": len(emails), "jobs": len(jobs), "results": rows, "parity": parity}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Local stand-in for the Gmail REST API's messages.get, for exercising the
+concurrent fetcher without a Google account.
+
+    python benchmarks/fake_gmail_server.py --port 8765 --latency-ms 80
+
+Serves GET /gmail/v1/users/me/messages/<id> with canned message JSON after
+a simulated round-trip delay. It enforces a per-user quota like Gmail's
+(5 units per get, 250 units per second by default), answering 429
+rateLimitExceeded once it is exceeded, and can inject random 503s. Point
+the "gmailApiBaseUrl" setting (or ConcurrentMessageFetcher's baseUrl) at
+it; see bench_gmail_fetch.py.
+"""
+import argparse
+import base64
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MESSAGE_PATH = re.compile(r"^/gmail/v1/users/me/messages/([^/?]+)")
+
+
+def cannedMessage(messageId):
+    body = f"Thank you for applying. Unfortunately we will not move forward ({messageId})."
+    return {
+        "id": messageId,
+        "threadId": "t" + messageId,
+        "labelIds": ["Label_1"],
+        "payload": {
+            "headers": [
+                {"name": "Subject", "value": f"Your application {messageId}"},
+                {"name": "Date", "value": "Mon, 1 Jan 2024 09:00:00 +0000"},
+                {"name": "From", "value": "jobs@example.com"},
+            ],
+            "body": {"data": base64.urlsafe_b64encode(body.encode()).decode()},
+        },
+    }
+
+
+class FakeGmailState:
+    """Quota window and request counters shared by all handler threads."""
+
+    def __init__(self, latencyMs=50, unitsPerSecond=250, errorRate=0.0, seed=0):
+        self.latency = latencyMs / 1000
+        self.unitsPerSecond = unitsPerSecond
+        self.errorRate = errorRate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.window = []
+        self.counts = {"ok": 0, "throttled": 0, "errors": 0}
+
+    def admit(self, units=5):
+        """Charge units against the last second's quota; False if over it."""
+        with self.lock:
+            now = time.monotonic()
+            self.window = [(t, u) for t, u in self.window if now - t < 1.0]
+            if sum(u for _, u in self.window) + units > self.unitsPerSecond:
+                self.counts["throttled"] += 1
+                return False
+            self.window.append((now, units))
+            if self.random.random() < self.errorRate:
+                self.counts["errors"] += 1
+                return None
+            self.counts["ok"] += 1
+            return True
+
+
+def makeHandler(state):
+    class FakeGmailHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, status, payload, headers=None):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            match = MESSAGE_PATH.match(self.path)
+            if not match:
+                self._send(404, {"error": {"code": 404, "message": "Not Found"}})
+                return
+
+            time.sleep(state.latency)
+
+            admitted = state.admit()
+            if admitted is False:
+                self._send(429, {"error": {"code": 429, "message": "User-rate limit exceeded",
+                                           "errors": [{"reason": "rateLimitExceeded"}]}})
+            elif admitted is None:
+                self._send(503, {"error": {"code": 503, "message": "Backend Error"}})
+            else:
+                self._send(200, cannedMessage(match.group(1)))
+
+        def log_message(self, format, *args):
+            pass
+
+    return FakeGmailHandler
+
+
+def startServer(port=0, **options):
+    """Start the fake server on a daemon thread. Returns (server, state, baseUrl)."""
+    state = FakeGmailState(**options)
+    server = ThreadingHTTPServer(("127.0.0.1", port), makeHandler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--units-per-second", type=int, default=250)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    args = parser.parse_args()
+
+    server, state, baseUrl = startServer(args.port, latencyMs=args.latency_ms,
+                                         unitsPerSecond=args.units_per_second, errorRate=args.error_rate)
+    print(f"Fake Gmail API on {baseUrl} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(5)
+            print(state.counts)
+    except KeyboardInterrupt:
+        server.shutdown()
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
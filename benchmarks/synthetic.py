@@ -0,0 +1,98 @@
+"""
+Synthetic jobs and labelled emails for the benchmark and evaluation scripts.
+Everything is generated from a seed, so runs are reproducible.
+"""
+import random
+
+
+COMPANY_PARTS = [
+    "acme", "globex", "initech", "umbrella", "hooli", "stark", "wayne", "wonka",
+    "cyber", "dyne", "tyrell", "soylent", "vandelay", "massive", "pied", "piper",
+    "aperture", "black", "mesa", "oscorp", "nakatomi", "gringotts", "monarch", "vector",
+]
+COMPANY_SUFFIXES = ["", " Inc.", " Labs", " Systems", " Technologies", " Robotics", " LLC"]
+
+TITLES = [
+    "Software Engineering Intern", "Data Science Intern", "Machine Learning Intern",
+    "Robotics Intern", "Hardware Engineering Intern", "Product Management Intern",
+    "Quantitative Research Intern", "Embedded Systems Intern", "Security Engineering Intern",
+    "Frontend Developer Intern", "Backend Developer Intern", "Mechanical Engineering Intern",
+]
+
+REJECTED_TEMPLATES = [
+    "Thank you for your interest in the {title} position at {company}. After careful "
+    "consideration we have decided to move forward with other candidates.",
+    "Unfortunately we will not be moving forward with your application for {title} at {company}.",
+    "We appreciate you applying to {company}. The {title} role has been filled.",
+]
+INTERVIEW_TEMPLATES = [
+    "We were impressed by your application to {company} and would like to invite you to "
+    "interview for the {title} position.",
+    "Congratulations! The {company} team wants to schedule a call about the {title} role.",
+    "Next steps for your {title} application at {company}: please pick an interview slot.",
+]
+# Emails that don't name the company force the embedding stage
+ANONYMOUS_TEMPLATES = [
+    "Thanks for applying to our {title} opening. We have decided not to proceed.",
+    "Your application for {title} has moved to the interview stage.",
+]
+UNRELATED_TEMPLATES = [
+    "Your weekly newsletter: ten tips for a better resume.",
+    "Reminder: your library books are due next week.",
+]
+SIGNATURE = "\n\nBest regards,\nThe Recruiting Team\nThis email is confidential and intended only for the recipient."
+
+
+def makeJobs(count, seed=0):
+    rng = random.Random(seed)
+    jobs = []
+    for i in range(count):
+        company = (rng.choice(COMPANY_PARTS) + rng.choice(COMPANY_PARTS)).title() + rng.choice(COMPANY_SUFFIXES)
+        jobs.append({
+            "company": company,
+            "title": rng.choice(TITLES),
+            "date": "2026-01-01",
+            "status": "Applied",
+        })
+    return jobs
+
+
+def makeEmails(jobs, count, seed=0, anonymousRate=0.3, unrelatedRate=0.1):
+    """
+    Return (emails, labels) where labels[i] is the index of the job email i
+    is about, or None for unrelated emails.
+    """
+    rng = random.Random(seed + 1)
+    emails = []
+    labels = []
+
+    for i in range(count):
+        roll = rng.random()
+        emailType = rng.choice(["Rejected", "Interview"])
+
+        if roll < unrelatedRate or not jobs:
+            body = rng.choice(UNRELATED_TEMPLATES)
+            label = None
+        else:
+            label = rng.randrange(len(jobs))
+            job = jobs[label]
+            if roll < unrelatedRate + anonymousRate:
+                template = rng.choice(ANONYMOUS_TEMPLATES)
+            elif emailType == "Rejected":
+                template = rng.choice(REJECTED_TEMPLATES)
+            else:
+                template = rng.choice(INTERVIEW_TEMPLATES)
+            body = template.format(company=job["company"], title=job["title"])
+
+        emails.append({
+            "id": f"synthetic-{seed}-{i}",
+            "from": "recruiting@example.com",
+            "to": "me@example.com",
+            "subject": "Update on your application",
+            "date": f"Mon, 1 Jan 2026 00:{i // 60 % 60:02d}:{i % 60:02d} +0000",
+            "body": body + SIGNATURE,
+            "type": emailType,
+        })
+        labels.append(label)
+
+    return emails, labels
@@ -0,0 +1,6 @@
+from app.embedding_model import exportOnnxModel
+
+
+if __name__ == "__main__":
+    # Set "embeddingBackend": "onnx" in data/settings.json to use the exported model
+    print(exportOnnxModel())
@@ -1,5 +1,6 @@
 import tkinter as tk
 from tkinter import messagebox
+import multiprocessing
 import os
 from app.paths import get_browsers_path
 from app.Windows.job_tracker_app import JobTrackerApp
@@ -19,6 +20,9 @@ def launch_job_tracker_app():
 
 
 if __name__ == "__main__":
+    # Needed for embedding worker processes in the PyInstaller build
+    multiprocessing.freeze_support()
+
     if is_playwright_setup_needed():
         messagebox.showerror("Playwright Error", "Playwright setup needed. Follow instructions on Github for setting up Playwright.")
     else: